@@ -0,0 +1,25 @@
+#!/env/python
+"""
+Win rate by street and equity bucket from a decision log.
+
+Usage: python analyze_decisions.py <decision log directory> [buckets]
+"""
+import sys
+
+from virtual_player.decision_log import DecisionLogReader
+
+
+if __name__ == '__main__':
+    buckets = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    stats = DecisionLogReader(sys.argv[1]).win_rate_by_street_and_equity(buckets)
+
+    print("{:<8} {:>12} {:>10} {:>10} {:>12}".format("street", "equity", "decisions", "win rate", "avg profit"))
+    for street in DecisionLogReader.STREETS:
+        for bucket in [None] + list(range(buckets)):
+            if (street, bucket) in stats:
+                decisions, win_rate, profit = stats[(street, bucket)]
+                equity = "-" if bucket is None else "{:.2f}-{:.2f}".format(
+                    bucket / float(buckets),
+                    (bucket + 1) / float(buckets)
+                )
+                print("{:<8} {:>12} {:>10} {:>10.1%} {:>12.2f}".format(street, equity, decisions, win_rate, profit))
@@ -0,0 +1,64 @@
+#!/env/python
+"""
+Equity error versus number of simulated boards for every virtual board sampling method.
+The exact equity of each spot is computed enumerating all the runouts.
+
+Usage: python -m benchmarks.virtual_boards [repetitions]
+"""
+import math
+import sys
+from itertools import combinations
+
+from virtual_player.card import Card
+from virtual_player.hand_ranks import FastHoldemPokerScoreDetector
+from virtual_player.score_detector import HandEvaluator
+
+
+SPOTS = [
+    # Flush draw on the flop
+    ("AhKh / 7h 2h 9c", [Card(14, 3), Card(13, 3)], [Card(7, 3), Card(2, 3), Card(9, 1)]),
+    # Top pair on the flop
+    ("QsJd / Qc 8h 3s", [Card(12, 0), Card(11, 2)], [Card(12, 1), Card(8, 3), Card(3, 0)]),
+    # Open ended straight draw on the turn
+    ("9c8c / 7d 6s 2h Kc", [Card(9, 1), Card(8, 1)], [Card(7, 2), Card(6, 0), Card(2, 3), Card(13, 1)]),
+]
+
+SIMULATIONS = [5, 10, 20, 50, 100]
+
+
+def exact_equity(hand_evaluator, my_cards, board):
+    deck = [
+        card for card in (Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4))
+        if card not in my_cards and card not in board
+    ]
+    cases = [
+        hand_evaluator.evaluate_case(my_cards, board + list(runout), None)
+        for runout in combinations(deck, HandEvaluator.BOARD_SIZE - len(board))
+    ]
+    return sum(cases) / len(cases)
+
+
+def main(repetitions):
+    methods = [HandEvaluator.SAMPLING_UNIFORM, HandEvaluator.SAMPLING_STRATIFIED]
+    hand_evaluators = {method: HandEvaluator(FastHoldemPokerScoreDetector(), sampling=method) for method in methods}
+    exact_evaluator = HandEvaluator(FastHoldemPokerScoreDetector())
+
+    for label, my_cards, board in SPOTS:
+        exact = exact_equity(exact_evaluator, my_cards, board)
+        print("{} - exact equity {:.4f}".format(label, exact))
+        print("{:>12}".format("simulations") + "".join("{:>12}".format(method) for method in methods))
+        for simulations in SIMULATIONS:
+            errors = []
+            for method in methods:
+                squared_error = 0.0
+                for seed in range(repetitions):
+                    hand_evaluators[method].seed(seed)
+                    equity = hand_evaluators[method].hand_strength(my_cards, board, simulations=simulations)
+                    squared_error += (equity - exact) ** 2
+                errors.append(math.sqrt(squared_error / repetitions))
+            print("{:>12}".format(simulations) + "".join("{:>12.4f}".format(error) for error in errors))
+        print("")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
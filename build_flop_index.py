@@ -0,0 +1,23 @@
+#!/env/python
+"""
+Precomputes the texture and hand class equity buckets of all the canonical flops (see FlopIndex).
+
+Usage: python build_flop_index.py <index file> [runouts per flop] [buckets]
+"""
+import logging
+import os
+import sys
+
+from virtual_player.flop_index import FlopIndex
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG if 'DEBUG' in os.environ else logging.INFO)
+
+    FlopIndex.build(
+        sys.argv[1],
+        num_runouts=int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+        num_buckets=int(sys.argv[3]) if len(sys.argv) > 3 else 8,
+        cache_dir=os.getenv("EQUITY_MATRIX_DIR"),
+        logger=logging.getLogger("flop-index")
+    )
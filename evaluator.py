@@ -0,0 +1,31 @@
+#!/env/python
+import logging
+import os
+
+from virtual_player.equity_cache import EquityCache
+from virtual_player.evaluator_service import EvaluatorServer
+from virtual_player.hand_ranks import FastHoldemPokerScoreDetector, FastOmahaPokerScoreDetector
+from virtual_player.score_detector import HandEvaluator, OmahaHandEvaluator
+
+
+HAND_EVALUATORS = {
+    "holdem": lambda equity_cache: HandEvaluator(FastHoldemPokerScoreDetector(), equity_cache=equity_cache),
+    "omaha": lambda equity_cache: OmahaHandEvaluator(FastOmahaPokerScoreDetector(), equity_cache=equity_cache),
+}
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG if 'DEBUG' in os.environ else logging.INFO)
+
+    socket_path = os.getenv("EVALUATOR_SOCKET", "/tmp/poker-evaluator.sock")
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    equity_cache = EquityCache(os.environ["EQUITY_CACHE"]) if "EQUITY_CACHE" in os.environ else None
+
+    server = EvaluatorServer(
+        path=socket_path,
+        hand_evaluator=HAND_EVALUATORS[os.getenv("GAME", "holdem")](equity_cache),
+        logger=logging.getLogger("evaluator")
+    )
+    server.serve_forever()
@@ -0,0 +1,68 @@
+#!/env/python
+"""
+Load test of a poker server with bots (see virtual_player.loadgen.load_scenario for the scenario format).
+
+Usage: python loadgen.py <scenario file>
+    DEALER=local runs the bots against an in-process dealer instead of the server on REDIS_URL
+    CHANNEL=stream uses session channels on Redis streams instead of lists, as the server must
+"""
+import json
+import logging
+import os
+import sys
+
+from virtual_player.channel_redis import ChannelRedis
+from virtual_player.channel_redis_stream import StreamMultiplexer
+from virtual_player.loadgen import LoadGenerator, load_scenario
+from virtual_player.local_dealer import LocalConnector, LocalDealer
+from virtual_player.player_client import PlayerClientConnector, stream_channel_factory
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG if 'DEBUG' in os.environ else logging.INFO)
+    logger = logging.getLogger("loadgen")
+
+    if os.getenv("DEALER") == "local":
+        dealer = LocalDealer(delay=float(os.getenv("DEALER_DELAY", "0")))
+        connector_factory = lambda bot_logger: LocalConnector(dealer, bot_logger)
+    else:
+        import redis
+
+        redis = redis.from_url(os.environ["REDIS_URL"])
+        lobby = os.getenv("LOBBY", "texas-holdem-poker:lobby")
+        # All the bots read their stream channels through one multiplexer
+        if os.getenv("CHANNEL", "list") == "stream":
+            channel_factory = stream_channel_factory(StreamMultiplexer(redis))
+        else:
+            channel_factory = ChannelRedis
+        connector_factory = lambda bot_logger: PlayerClientConnector(
+            redis,
+            lobby,
+            bot_logger,
+            channel_factory=channel_factory
+        )
+
+    reports = LoadGenerator(connector_factory, logger).run(load_scenario(sys.argv[1]))
+
+    for report in reports:
+        print("Phase {} ({} bots, {:.0f} seconds): {:.1f} messages/s, {:.1f} decisions/s, {:.2f} games/s, "
+              "{} errors".format(
+                  report["phase"],
+                  report["bots"],
+                  report["elapsed"],
+                  report["throughput"]["messages"],
+                  report["throughput"]["decisions"],
+                  report["throughput"]["games"],
+                  report["counters"]["errors"]
+              ))
+        print("    {:<14} {:>8} {:>10} {:>10} {:>10} {:>10}".format("latency (ms)", "count", "p50", "p99", "p999", "max"))
+        for name in sorted(report["latencies"]):
+            latency = report["latencies"][name]
+            print("    {:<14} {:>8} {:>10} {:>10} {:>10} {:>10}".format(name, latency["count"], *[
+                "-" if latency[key] is None else "{:.2f}".format(latency[key] * 1000.0)
+                for key in ("p50", "p99", "p999", "max")
+            ]))
+
+    if "REPORT" in os.environ:
+        with open(os.environ["REPORT"], "w") as f:
+            json.dump(reports, f, indent=2)
@@ -1,22 +1,64 @@
 #!/env/python
+import gc
 import logging.handlers
 import os
 import random
+import signal
 import string
+import time
 import uuid
 
-import redis
-
-from virtual_player.player_client import PlayerClientConnector
+from virtual_player.channel import ChannelError, MessageTimeout
+from virtual_player.channel_recorder import MessageLog
+from virtual_player.decision_log import DecisionLog
+from virtual_player.equity_cache import EquityCache
+from virtual_player.evaluator_service import RemoteHandEvaluator
+from virtual_player.flop_index import FlopIndex
+from virtual_player.channel_redis import ChannelRedis
+from virtual_player.channel_redis_stream import StreamMultiplexer
+from virtual_player.player_client import PlayerClientConnector, ReplayConnector, stream_channel_factory
 from virtual_player.bet_strategy import HoldemPlayerClient, stategy_factory
+from virtual_player.hand_ranks import FastHoldemPokerScoreDetector, FastOmahaPokerScoreDetector, get_hand_ranks
+from virtual_player.opponent_stats import OpponentStatsTracker
 from virtual_player.player import Player
+from virtual_player.profiling import DecisionProfiler, ProfilingBetStrategy
+from virtual_player.score_detector import HandEvaluator, HoldemPokerScoreDetector, OmahaHandEvaluator, \
+    OmahaPokerScoreDetector
+
+
+MEMORY_REPORT_INTERVAL = 300
+
+# Workers dying younger than MIN_WORKER_LIFETIME seconds are restarted after a delay doubling from
+# RESTART_DELAY up to MAX_RESTART_DELAY, not to respawn a worker crashing at startup in a tight loop
+MIN_WORKER_LIFETIME = 10.0
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 60.0
+
+# Seconds before reconnecting after a connection failure, doubling up to MAX_RECONNECT_DELAY
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30.0
+
+# Lobby, score detector and hand evaluator (given the equity cache) by game
+GAMES = {
+    "holdem": (
+        "texas-holdem-poker:lobby",
+        HoldemPokerScoreDetector,
+        lambda equity_cache: HandEvaluator(FastHoldemPokerScoreDetector(), equity_cache=equity_cache)
+    ),
+    "omaha": (
+        "omaha-poker:lobby",
+        OmahaPokerScoreDetector,
+        lambda equity_cache: OmahaHandEvaluator(FastOmahaPokerScoreDetector(), equity_cache=equity_cache)
+    ),
+}
 
 
 def get_random_string(length=8):
     return ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(length))
 
 
-def play_game():
+def new_bot():
+    """Bot with its own identity, kept across games."""
     pid = get_random_string()
     player_id = "hal-{}".format(pid)
     player_name = "Hal {}".format(pid)
@@ -24,30 +66,277 @@ def play_game():
     logger = logging.getLogger("player.{}".format(player_id))
     logger.setLevel(logging.INFO)
 
-    player_connector = PlayerClientConnector(redis, "texas-holdem-poker:lobby", logger)
-
-    player = Player(
-        id=player_id,
-        name=player_name,
-        money=1000.0
-    )
+    if replay_file:
+        player_connector = ReplayConnector(replay_file, logger, real_time=replay_real_time)
+        message_log = None
+        player = player_connector.recorded_player()
+    else:
+        message_log = MessageLog(os.path.join(record_dir, "{}.log".format(player_id))) if record_dir else None
+        player_connector = PlayerClientConnector(
+            redis,
+            lobby,
+            logger,
+            message_log=message_log,
+            channel_factory=channel_factory
+        )
+        player = Player(
+            id=player_id,
+            name=player_name,
+            money=1000.0
+        )
     bot = HoldemPlayerClient(
         player_connector=player_connector,
         player=player,
-        bet_strategy=stategy_factory(strategy=bet_strategy, logger=logger),
-        logger=logger
+        bet_strategy=ProfilingBetStrategy(
+            stategy_factory(
+                strategy=bet_strategy,
+                logger=logger,
+                equity_cache=equity_cache,
+                evaluator_socket=evaluator_socket,
+                flop_index=flop_index
+            ),
+            profiler=profiler,
+            bot_id=player.id
+        ),
+        logger=logger,
+        score_detector=GAMES[game][1](),
+        decision_log=decision_log,
+        opponent_stats=opponent_stats,
+        rejoin=not replay_file,
+        # Rates the hands shown down
+        hand_evaluator=RemoteHandEvaluator(evaluator_socket) if evaluator_socket else GAMES[game][2](equity_cache)
     )
+    return bot, logger, message_log
+
+
+def play_game(bot, logger, message_log):
+    try:
+        bot.play()
+    finally:
+        if message_log:
+            message_log.flush()
+        if decision_log:
+            decision_log.flush()
+        if opponent_stats_file:
+            opponent_stats.save(opponent_stats_file)
+
+    if equity_cache:
+        logger.info("Equity cache: {hits} hits, {misses} misses, hit rate {hit_rate:.1%}".format(**equity_cache.stats()))
+
+
+def play_forever():
+    bot, logger, message_log = new_bot()
+    reconnect_delay = RECONNECT_DELAY
+    while True:
+        try:
+            play_game(bot, logger, message_log)
+        except (ChannelError, MessageTimeout) as ex:
+            # Exponential backoff with full jitter, so that bots do not all reconnect at once
+            delay = random.uniform(0, reconnect_delay)
+            logger.warning("Connection failed ({}): reconnecting in {:.2f} seconds".format(ex, delay))
+            time.sleep(delay)
+            reconnect_delay = min(reconnect_delay * 2, MAX_RECONNECT_DELAY)
+        else:
+            reconnect_delay = RECONNECT_DELAY
+
+
+def memory_usage(pid):
+    """
+    Resident memory of a process in kB: rss, pss (shared pages split among the processes sharing them)
+    and shared (pages shared with other processes, i.e. not yet copied on write).
+    """
+    usage = {"rss": 0, "pss": 0, "shared": 0}
+    try:
+        with open("/proc/{}/smaps_rollup".format(pid)) as f:
+            for line in f:
+                fields = line.split()
+                if fields[0] == "Rss:":
+                    usage["rss"] = int(fields[1])
+                elif fields[0] == "Pss:":
+                    usage["pss"] = int(fields[1])
+                elif fields[0] in ("Shared_Clean:", "Shared_Dirty:"):
+                    usage["shared"] += int(fields[1])
+    except (IOError, OSError):
+        pass
+    return usage
+
+
+def supervise(num_workers):
+    """
+    Pre-fork supervisor.
+    Heavy modules and lookup tables are loaded once, then every worker is forked and shares them copy-on-write.
+    Workers that die are restarted, with a backoff if they crash early.
+    """
+    logger = logging.getLogger("supervisor")
+
+    start_time = time.time()
+    hand_ranks = get_hand_ranks()
+    if hasattr(gc, "freeze"):
+        # Keep the garbage collector from writing to (and therefore copying) the pages of the preloaded objects
+        gc.freeze()
+    loading_time = time.time() - start_time
+
+    supervisor_usage = memory_usage(os.getpid())
+    logger.info("Startup: {} table entries loaded in {:.2f}s, supervisor RSS {:.1f} MB".format(
+        hand_ranks.size,
+        loading_time,
+        supervisor_usage["rss"] / 1024.0
+    ))
+
+    workers = set()
+    # Start time by worker pid, restart times of the dead workers
+    started = {}
+    restarts = []
+    restart_delay = RESTART_DELAY
+    worker_usr1_handler = signal.getsignal(signal.SIGUSR1)
 
-    bot.play()
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            # Worker
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, worker_usr1_handler)
+            try:
+                play_forever()
+            except Exception:
+                logger.exception("Worker {} crashed".format(os.getpid()))
+            os._exit(1)
+        workers.add(pid)
+        started[pid] = time.time()
+        return pid
+
+    def terminate(signum, frame):
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+        os._exit(0)
+
+    def forward(signum, frame):
+        for pid in workers:
+            os.kill(pid, signum)
+
+    signal.signal(signal.SIGTERM, terminate)
+    # Profiling requests go to the workers
+    signal.signal(signal.SIGUSR1, forward)
+
+    for _ in range(num_workers):
+        spawn()
+
+    last_report = 0.0
+    while True:
+        # During a backoff no worker may be left to wait for
+        pid, status = os.waitpid(-1, os.WNOHANG) if workers else (0, 0)
+        if pid:
+            workers.discard(pid)
+            if time.time() - started.pop(pid) < MIN_WORKER_LIFETIME:
+                delay = restart_delay
+                restart_delay = min(restart_delay * 2, MAX_RESTART_DELAY)
+            else:
+                delay = 0.0
+                restart_delay = RESTART_DELAY
+            logger.warning("Worker {} died (status {}): restarting in {:.0f}s".format(pid, status, delay))
+            restarts.append(time.time() + delay)
+        elif restarts and min(restarts) <= time.time():
+            restarts.remove(min(restarts))
+            spawn()
+        elif workers and time.time() - last_report > MEMORY_REPORT_INTERVAL:
+            report_memory(logger, workers)
+            last_report = time.time()
+        else:
+            time.sleep(min([1.0] + [max(0.0, restart - time.time()) for restart in restarts]))
+
+
+def report_memory(logger, workers):
+    total_usage = {"rss": 0, "pss": 0, "shared": 0}
+    for pid in workers:
+        usage = memory_usage(pid)
+        for key in total_usage:
+            total_usage[key] += usage[key]
+        logger.info("Worker {}: RSS {:.1f} MB, PSS {:.1f} MB, shared {:.1f} MB".format(
+            pid,
+            usage["rss"] / 1024.0,
+            usage["pss"] / 1024.0,
+            usage["shared"] / 1024.0
+        ))
+    if workers:
+        logger.info("{} workers: PSS {:.1f} MB in total, {:.1f} MB per worker".format(
+            len(workers),
+            total_usage["pss"] / 1024.0,
+            total_usage["pss"] / 1024.0 / len(workers)
+        ))
 
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.DEBUG if 'DEBUG' in os.environ else logging.INFO)
 
-    redis_url = os.environ["REDIS_URL"]
-    redis = redis.from_url(redis_url)
+    game = os.getenv("GAME", "holdem")
+    bet_strategy = os.getenv("BET_STRATEGY", "smart-omaha" if game == "omaha" else "smart")
+    # Lobby of the game by default, another one (e.g. of a given stakes) in LOBBY
+    lobby = os.getenv("LOBBY", GAMES[game][0])
 
-    bet_strategy = os.getenv("BET_STRATEGY", "smart")
+    # On demand profiling: kill -USR1 <pid> profiles the next PROFILE_DECISIONS decisions (or PROFILE_SECONDS)
+    profiler = DecisionProfiler(
+        output_dir=os.getenv("PROFILE_DIR", "."),
+        num_decisions=int(os.getenv("PROFILE_DECISIONS", "10")),
+        duration=float(os.getenv("PROFILE_SECONDS", "0")),
+        logger=logging.getLogger("profiler")
+    )
+    signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.arm())
+    if "PROFILE" in os.environ:
+        profiler.arm()
 
-    while True:
-        play_game()
+    # Equity cache file shared by all the bots of the host
+    equity_cache = EquityCache(
+        os.environ["EQUITY_CACHE"],
+        size=int(os.getenv("EQUITY_CACHE_SIZE", str(1 << 20)))
+    ) if "EQUITY_CACHE" in os.environ else None
+
+    # Socket of the evaluator service (see evaluator.py) used in place of a local hand evaluator
+    evaluator_socket = os.getenv("EVALUATOR_SOCKET")
+
+    # Flop textures and hand class buckets built by build_flop_index.py
+    flop_index = FlopIndex(os.environ["FLOP_INDEX"]) if "FLOP_INDEX" in os.environ else None
+
+    # Structured log of the decisions (see analyze_decisions.py)
+    decision_log = DecisionLog(os.environ["DECISION_LOG"]) if "DECISION_LOG" in os.environ else None
+
+    # Opponent statistics, restored from and saved to OPPONENT_STATS across sessions
+    opponent_stats_file = os.getenv("OPPONENT_STATS")
+    max_opponents = int(os.getenv("MAX_OPPONENTS", "10000"))
+    if opponent_stats_file and os.path.exists(opponent_stats_file):
+        opponent_stats = OpponentStatsTracker.load(opponent_stats_file, max_opponents=max_opponents)
+    else:
+        opponent_stats = OpponentStatsTracker(max_opponents=max_opponents)
+
+    # Recording of the channel traffic, one file per bot
+    record_dir = os.getenv("RECORD_DIR")
+    # Replay of a recording (all of its sessions) in place of the server
+    replay_file = os.getenv("REPLAY_FILE")
+    replay_real_time = "REPLAY_REAL_TIME" in os.environ
+
+    if replay_file:
+        # Replays every session of the recording
+        bot, logger, message_log = new_bot()
+        try:
+            while True:
+                play_game(bot, logger, message_log)
+        except MessageTimeout:
+            logger.info("End of the recording")
+    else:
+        import redis
+
+        redis_url = os.environ["REDIS_URL"]
+        redis = redis.from_url(redis_url)
+
+        # Session channels on Redis lists (default) or streams, the server must use the same backend
+        if os.getenv("CHANNEL", "list") == "stream":
+            channel_factory = stream_channel_factory(StreamMultiplexer(redis))
+        else:
+            channel_factory = ChannelRedis
+
+        # Number of bots forked by the supervisor
+        num_workers = int(os.getenv("WORKERS", "0"))
+
+        if num_workers:
+            supervise(num_workers)
+        else:
+            play_forever()
@@ -0,0 +1,101 @@
+import logging
+import time
+
+from virtual_player.bet_strategy import BetDecision, HoldemGameState, SmartBetStrategy
+from virtual_player.card import Card
+from virtual_player.evaluator_service import RemoteHandEvaluator
+from virtual_player.flop_index import FlopIndex
+from virtual_player.game import GameScores
+from virtual_player.hand_ranks import FastHoldemPokerScoreDetector
+from virtual_player.player import Player
+from virtual_player.score_detector import HandEvaluator
+
+
+def _decision(me, hole, board, deadline):
+    scores = GameScores(FastHoldemPokerScoreDetector())
+    scores.assign_cards(me.id, hole)
+    scores.add_shared_cards(board)
+    game_state = HoldemGameState(players=None, scores=scores, pot=30.0, big_blind=10.0, small_blind=5.0)
+    return BetDecision(me, game_state, {}, 10.0, 200.0, deadline)
+
+
+def test_bet_many():
+    me = Player("bot", "Bot", 1000.0)
+    strategy = SmartBetStrategy(HandEvaluator(FastHoldemPokerScoreDetector(), seed=1), logging.getLogger("bets"))
+    decisions = [
+        _decision(me, [Card(14, 1), Card(14, 2)], [], time.time() + 1),
+        _decision(me, [Card(4, 1), Card(3, 0)], [Card(14, 0), Card(9, 3), Card(12, 2)], time.time() + 1),
+        _decision(me, [Card(10, 1), Card(11, 1)], [Card(14, 0), Card(9, 3), Card(12, 2), Card(2, 2)], 0.0),
+    ]
+    bets = strategy.bet_many(decisions)
+    assert len(bets) == 3
+    for bet in bets:
+        assert bet == -1 or 10.0 <= bet <= 200.0
+
+
+class ConstantHandEvaluator:
+    def hand_strength_many(self, hands, deadlines=None):
+        return [0.2] * len(hands)
+
+    def effective_strength_many(self, hands, deadlines=None):
+        deadlines = deadlines if deadlines is not None else [None] * len(hands)
+        return [0.6 if deadline is None or time.time() < deadline else None for deadline in deadlines]
+
+
+def test_bet_many_blends_the_potential_before_the_deadline():
+    strategy = SmartBetStrategy(ConstantHandEvaluator(), logging.getLogger("bets"))
+    me = Player("bot", "Bot", 1000.0)
+    board = [Card(14, 0), Card(9, 3), Card(12, 2)]
+    strategy.bet_many([_decision(me, [Card(4, 1), Card(3, 0)], board, time.time() + 1)])
+    assert strategy.last_hand_strength == 0.4
+    # Past its deadline, the potential is left out
+    strategy.bet_many([_decision(me, [Card(4, 1), Card(3, 0)], board, 0.0)])
+    assert strategy.last_hand_strength == 0.2
+
+
+def test_bet_many_meets_the_deadline():
+    me = Player("bot", "Bot", 1000.0)
+    strategy = SmartBetStrategy(HandEvaluator(FastHoldemPokerScoreDetector(), seed=1), logging.getLogger("bets"))
+    start_time = time.time()
+    decisions = [
+        _decision(me, [Card(14, 1), Card(14, 2)], [Card(rank, 0), Card(9, 3), Card(12, 2)], start_time + 0.2)
+        for rank in range(2, 9)
+    ] * 3
+    strategy.bet_many(decisions)
+    # At most one board evaluated past the deadline
+    assert time.time() - start_time < 0.8
+
+
+def test_local_evaluation_when_the_evaluator_is_unavailable(tmpdir):
+    local_hand_evaluators = []
+
+    def local_hand_evaluator():
+        local_hand_evaluators.append(HandEvaluator(FastHoldemPokerScoreDetector(), seed=1))
+        return local_hand_evaluators[-1]
+
+    strategy = SmartBetStrategy(
+        RemoteHandEvaluator(str(tmpdir.join("missing.sock"))),
+        logging.getLogger("bets"),
+        local_hand_evaluator=local_hand_evaluator
+    )
+    board = [Card(2, 0), Card(7, 1), Card(9, 3)]
+    decision = _decision(Player("bot", "Bot", 1000.0), [Card(14, 1), Card(14, 2)], board, None)
+    for _ in range(2):
+        strategy.bet(decision.me, decision.game_state, decision.bets, decision.min_bet, decision.max_bet)
+        assert 0 <= strategy.last_hand_strength <= 1
+    assert len(local_hand_evaluators) == 1
+
+
+def test_flop_features(tmpdir):
+    path = str(tmpdir.join("flops.bin"))
+    board = [Card(14, 0), Card(9, 3), Card(12, 2), Card(2, 2)]
+    FlopIndex.build(path, num_runouts=2, flops=[[int(card) for card in board[:3]]])
+    strategy = SmartBetStrategy(
+        HandEvaluator(FastHoldemPokerScoreDetector(), seed=1),
+        logging.getLogger("bets"),
+        flop_index=FlopIndex(path)
+    )
+    decision = _decision(Player("bot", "Bot", 1000.0), [Card(14, 1), Card(14, 2)], board, None)
+    strategy.bet(decision.me, decision.game_state, decision.bets, decision.min_bet, decision.max_bet)
+    assert strategy.last_flop_features["suits"] == 3
+    assert strategy.last_flop_features["bucket"] == 7
@@ -0,0 +1,73 @@
+import collections
+import time
+
+import pytest
+
+from virtual_player.channel import Channel, MessageTimeout
+from virtual_player.channel_recorder import MessageLog, MessageLogReader, RecordingChannel, ReplayChannel
+
+
+class ChannelStub(Channel):
+    def __init__(self, messages):
+        self._messages = collections.deque(messages)
+        self.sent = []
+
+    def send_message(self, message):
+        self.sent.append(message)
+
+    def recv_message(self, timeout_epoch=None):
+        return self._messages.popleft()
+
+
+def record(path, messages):
+    message_log = MessageLog(path)
+    channel = RecordingChannel(ChannelStub(messages), message_log)
+    for _ in messages:
+        channel.recv_message()
+        channel.send_message({"message_type": "pong"})
+    message_log.close()
+
+
+def test_recording_keeps_direction_and_order(tmpdir):
+    path = str(tmpdir.join("session.log"))
+    record(path, [{"message_type": "ping"}, {"message_type": "disconnect"}])
+    records = [(direction, message) for direction, timestamp, message in MessageLogReader(path)]
+    assert records == [
+        (MessageLog.RECEIVED, {"message_type": "ping"}),
+        (MessageLog.SENT, {"message_type": "pong"}),
+        (MessageLog.RECEIVED, {"message_type": "disconnect"}),
+        (MessageLog.SENT, {"message_type": "pong"}),
+    ]
+
+
+def test_replay_feeds_received_messages(tmpdir):
+    path = str(tmpdir.join("session.log"))
+    record(path, [{"message_type": "ping"}, {"message_type": "disconnect"}])
+    channel = ReplayChannel(path)
+    assert channel.recv_message() == {"message_type": "ping"}
+    assert channel.recv_message() == {"message_type": "disconnect"}
+    with pytest.raises(MessageTimeout):
+        channel.recv_message()
+
+
+def test_real_time_replay_keeps_the_recorded_pace(tmpdir):
+    path = str(tmpdir.join("session.log"))
+    message_log = MessageLog(path)
+    message_log.append(MessageLog.RECEIVED, {"message_type": "ping"}, timestamp=100.0)
+    message_log.append(MessageLog.RECEIVED, {"message_type": "disconnect"}, timestamp=100.2)
+    message_log.close()
+
+    channel = ReplayChannel(path, real_time=True)
+    channel.recv_message()
+    started = time.time()
+    # Not delivered before its time
+    with pytest.raises(MessageTimeout):
+        channel.recv_message(time.time() + 0.05)
+    assert channel.recv_message() == {"message_type": "disconnect"}
+    assert 0.15 <= time.time() - started < 0.4
+
+    channel = ReplayChannel(path)
+    started = time.time()
+    channel.recv_message()
+    channel.recv_message()
+    assert time.time() - started < 0.1
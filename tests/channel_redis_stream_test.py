@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+redis = pytest.importorskip("redis")
+
+from virtual_player.channel import MessageTimeout
+from virtual_player.channel_redis_stream import ChannelRedisStream, StreamMultiplexer
+
+
+@pytest.fixture
+def local_redis():
+    client = redis.StrictRedis()
+    try:
+        client.ping()
+    except redis.exceptions.ConnectionError:
+        pytest.skip("No local redis-server")
+    yield client
+    for key in client.keys("test-stream:*"):
+        client.delete(key)
+
+
+def test_send_and_receive(local_redis):
+    bot = ChannelRedisStream(local_redis, "test-stream:O", "test-stream:I")
+    server = ChannelRedisStream(local_redis, "test-stream:I", "test-stream:O")
+    server.send_message({"message_type": "ping", "n": 1})
+    server.send_message({"message_type": "ping", "n": 2})
+    assert bot.recv_message(time.time() + 1)["n"] == 1
+    assert bot.recv_message(time.time() + 1)["n"] == 2
+    bot.send_message({"message_type": "pong"})
+    assert server.recv_message(time.time() + 1) == {"message_type": "pong"}
+    with pytest.raises(MessageTimeout):
+        bot.recv_message(time.time() + 0.1)
+
+
+def test_multiplexer_serves_many_channels(local_redis):
+    multiplexer = StreamMultiplexer(local_redis)
+    channels = [
+        ChannelRedisStream(local_redis, "test-stream:{}:O".format(n), "test-stream:{}:I".format(n), multiplexer)
+        for n in range(20)
+    ]
+    received = {}
+
+    def recv(n):
+        received[n] = channels[n].recv_message(time.time() + 5)["n"]
+
+    threads = [threading.Thread(target=recv, args=(n,)) for n in range(20)]
+    for thread in threads:
+        thread.start()
+    for n in reversed(range(20)):
+        ChannelRedisStream(local_redis, "test-stream:{}:I".format(n), "test-stream:{}:O".format(n)).send_message({"n": n})
+    for thread in threads:
+        thread.join()
+    assert received == {n: n for n in range(20)}
@@ -0,0 +1,65 @@
+import pytest
+
+from virtual_player.card import Card
+from virtual_player.decision_log import DecisionLog, DecisionLogReader
+
+
+def log_decision(decision_log, hand_id, street, equity, bet):
+    decision_log.log_decision(
+        bot_id="hal-1",
+        hand_id=hand_id,
+        street=street,
+        hole=[Card(14, 0), Card(13, 0)],
+        board=[Card(2, 1), Card(7, 2), Card(9, 3)][0:3 if street else 0],
+        pot=30.0,
+        min_bet=10.0,
+        max_bet=100.0,
+        equity=equity,
+        bet=bet,
+        latency=0.05
+    )
+
+
+def test_win_rate_by_street_and_equity(tmpdir):
+    decision_log = DecisionLog(str(tmpdir))
+    log_decision(decision_log, "game-1", 0, 0.62, 10.0)
+    log_decision(decision_log, "game-1", 1, 0.81, 30.0)
+    log_decision(decision_log, "game-2", 0, 0.65, -1)
+    log_decision(decision_log, "game-3", 0, 0.15, 10.0)
+    decision_log.log_hand("hal-1", "game-1", 70.0)
+    decision_log.log_hand("hal-1", "game-2", -5.0)
+    # game-3 is not over
+    decision_log.close()
+
+    stats = DecisionLogReader(str(tmpdir)).win_rate_by_street_and_equity(buckets=10)
+    assert stats == {
+        ("preflop", 6): (2, 0.5, pytest.approx(32.5)),
+        ("flop", 8): (1, 1.0, pytest.approx(70.0)),
+    }
+
+
+def test_equity_buckets(tmpdir):
+    decision_log = DecisionLog(str(tmpdir))
+    log_decision(decision_log, "game-1", 2, 1.0, 10.0)
+    log_decision(decision_log, "game-1", 2, None, 10.0)
+    log_decision(decision_log, "game-1", 2, 0.0, 10.0)
+    decision_log.log_hand("hal-1", "game-1", 20.0)
+    # Same hand, another bot
+    decision_log.log_hand("hal-2", "game-1", -20.0)
+    decision_log.close()
+
+    stats = DecisionLogReader(str(tmpdir)).win_rate_by_street_and_equity(buckets=4)
+    assert stats == {("turn", 3): (1, 1.0, 20.0), ("turn", None): (1, 1.0, 20.0), ("turn", 0): (1, 1.0, 20.0)}
+
+
+def test_columns_are_read_as_arrays(tmpdir):
+    decision_log = DecisionLog(str(tmpdir))
+    log_decision(decision_log, "game-1", 1, None, 30.0)
+    decision_log.close()
+
+    [(strings, (rows, decisions), hands)] = list(DecisionLogReader(str(tmpdir)).segments())
+    assert rows == 1
+    assert strings == ["hal-1"]
+    assert list(decisions["decisions.hand_hash"]) == [DecisionLog.hand_hash("game-1")]
+    assert list(decisions["decisions.board"]) == [int(Card(2, 1)), int(Card(7, 2)), int(Card(9, 3)), 0, 0]
+    assert list(decisions["decisions.choice"]) == [DecisionLog.RAISE]
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from virtual_player.card import Card
+from virtual_player.equity_cache import EquityCache
+from virtual_player.hand_ranks import FastHoldemPokerScoreDetector
+from virtual_player.score_detector import HandEvaluator
+
+
+def test_get_returns_equity_of_isomorphic_hands(tmpdir):
+    cache = EquityCache(str(tmpdir.join("equity.cache")), size=64)
+    cache.put([Card(14, 3), Card(13, 3)], [Card(7, 3), Card(2, 3), Card(9, 1)], 0.71)
+    # Same hand with hearts and clubs swapped
+    assert cache.get([Card(14, 1), Card(13, 1)], [Card(7, 1), Card(2, 1), Card(9, 3)]) == pytest.approx(0.71)
+    assert cache.get([Card(14, 1), Card(13, 2)], [Card(7, 1), Card(2, 1), Card(9, 3)]) is None
+    assert cache.get([Card(14, 3), Card(13, 3)], [Card(7, 3), Card(2, 3), Card(9, 1)], opponents=2) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_entries_are_shared_through_the_file(tmpdir):
+    path = str(tmpdir.join("equity.cache"))
+    writer = EquityCache(path, size=64)
+    reader = EquityCache(path, size=64)
+    writer.put([Card(4, 1), Card(3, 0)], [], 0.32)
+    assert reader.get([Card(4, 2), Card(3, 1)], []) == pytest.approx(0.32)
+
+
+def test_least_recently_used_entries_are_evicted(tmpdir, monkeypatch):
+    cache = EquityCache(str(tmpdir.join("equity.cache")), size=EquityCache.WAYS)
+    hands = [[Card(rank, 0), Card(rank, 1)] for rank in range(2, 15)]
+    monkeypatch.setattr(EquityCache, "_clock", staticmethod(lambda: 1))
+    for hand in hands[:EquityCache.WAYS]:
+        cache.put(hand, [], 0.5)
+    # Touching the first two entries
+    monkeypatch.setattr(EquityCache, "_clock", staticmethod(lambda: 2))
+    for hand in hands[:2]:
+        assert cache.get(hand, []) == 0.5
+    monkeypatch.setattr(EquityCache, "_clock", staticmethod(lambda: 3))
+    for hand in hands[EquityCache.WAYS:EquityCache.WAYS + 2]:
+        cache.put(hand, [], 0.5)
+    survivors = [hand for hand in hands if cache.get(hand, []) is not None]
+    assert survivors == hands[:2] + hands[EquityCache.WAYS:EquityCache.WAYS + 2]
+
+
+def test_file_of_another_kind_is_reinitialized(tmpdir):
+    path = str(tmpdir.join("equity.cache"))
+    EquityCache(path, size=64).close()
+    with open(path, "r+b") as f:
+        f.write(b"\xff" * os.path.getsize(path))
+    cache = EquityCache(path, size=64)
+    assert cache.stats()["hits"] == 0
+    assert cache.get([Card(4, 1), Card(3, 0)], []) is None
+
+
+def test_effective_strengths_are_cached_apart_from_hand_strengths(tmpdir):
+    cache = EquityCache(str(tmpdir.join("equity.cache")), size=64)
+    hand_evaluator = HandEvaluator(FastHoldemPokerScoreDetector(), equity_cache=cache)
+    my_cards = [Card(14, 3), Card(13, 3)]
+    board = [Card(7, 3), Card(2, 3), Card(9, 1)]
+    effective_strength = hand_evaluator.effective_strength(my_cards, board)
+    assert cache.get(my_cards, board) is None
+    assert cache.get(my_cards, board, kind=EquityCache.EFFECTIVE_STRENGTH) == pytest.approx(effective_strength)
+    assert hand_evaluator.effective_strength(my_cards, board) == pytest.approx(effective_strength)
@@ -0,0 +1,21 @@
+from virtual_player.card import Card
+from virtual_player.equity_matrix import EquityMatrixCalculator
+
+
+def test_matrix_on_a_complete_board():
+    # A of spades, J of hearts, 9 of diamonds, 7 of clubs, 4 of spades
+    matrix = EquityMatrixCalculator().compute([[56, 47, 38, 29, 16]])
+    assert matrix.equity("AA", "KK") == 1.0
+    assert matrix.equity("KK", "AA") == 0.0
+    assert matrix.equity("QQ", "QQ") == 0.5
+
+
+def test_flop_matrices_are_cached_by_canonical_board(tmpdir):
+    calculator = EquityMatrixCalculator(cache_dir=str(tmpdir))
+    matrix = calculator.flop([Card(14, 0), Card(9, 3), Card(12, 2)], num_runouts=5)
+    assert len(tmpdir.listdir()) == 1
+    # Same flop with the suits swapped
+    cached = calculator.flop([Card(14, 1), Card(9, 0), Card(12, 3)], num_runouts=5)
+    assert len(tmpdir.listdir()) == 1
+    assert cached.values.tobytes() == matrix.values.tobytes()
+    assert 0.5 < matrix.equity("AKo", "72o") <= 1.0
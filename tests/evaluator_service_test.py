@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from virtual_player.card import Card
+from virtual_player.evaluator_service import EvaluatorError, EvaluatorServer, RemoteHandEvaluator
+from virtual_player.hand_ranks import FastHoldemPokerScoreDetector
+from virtual_player.score_detector import HandEvaluator, HoldemPokerScore
+
+
+@pytest.fixture
+def evaluator_socket(tmpdir):
+    path = str(tmpdir.join("evaluator.sock"))
+    server = EvaluatorServer(path, HandEvaluator(FastHoldemPokerScoreDetector()), logging.getLogger("evaluator"))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    timeout = time.time() + 10.0
+    while not tmpdir.join("evaluator.sock").exists():
+        assert time.time() < timeout, "The evaluator did not start"
+        time.sleep(0.01)
+    return path
+
+
+def test_remote_hand_strength(evaluator_socket):
+    hand_evaluator = RemoteHandEvaluator(evaluator_socket)
+    my_cards = [Card(4, 1), Card(3, 0)]
+    board = [Card(14, 0), Card(9, 3), Card(12, 2), Card(2, 2), Card(7, 1)]
+    assert hand_evaluator.hand_strength(my_cards, board) == \
+        HandEvaluator(FastHoldemPokerScoreDetector()).hand_strength(my_cards, board)
+
+
+def test_remote_scores(evaluator_socket):
+    scores = RemoteHandEvaluator(evaluator_socket).get_scores([
+        [Card(14, 0), Card(14, 1), Card(9, 3)],
+        [Card(2, 0), Card(3, 0), Card(4, 0), Card(5, 0), Card(6, 0)],
+    ])
+    assert [score.category for score in scores] == [HoldemPokerScore.PAIR, HoldemPokerScore.STRAIGHT_FLUSH]
+
+
+def test_expired_requests_are_rejected():
+    server = EvaluatorServer("", HandEvaluator(FastHoldemPokerScoreDetector()), logging.getLogger("evaluator"))
+    response = server.process({
+        "id": 1,
+        "method": "hand_strength",
+        "params": {"my_cards": [[4, 1], [3, 0]], "board": []},
+        "deadline": time.time() - 1.0
+    })
+    assert response == {"id": 1, "error": "Deadline exceeded"}
+
+
+def test_unavailable_evaluator(tmpdir):
+    with pytest.raises(EvaluatorError):
+        RemoteHandEvaluator(str(tmpdir.join("missing.sock"))).hand_strength([Card(4, 1), Card(3, 0)], [])
+
+
+def test_remote_hand_strength_many(evaluator_socket):
+    board = [Card(14, 0), Card(9, 3), Card(12, 2), Card(2, 2), Card(7, 1)]
+    hands = [([Card(4, 1), Card(3, 0)], board), ([Card(14, 1), Card(14, 2)], board)]
+    assert RemoteHandEvaluator(evaluator_socket).hand_strength_many(hands) == \
+        HandEvaluator(FastHoldemPokerScoreDetector()).hand_strength_many(hands)
+
+
+def test_process_batch():
+    server = EvaluatorServer(None, HandEvaluator(FastHoldemPokerScoreDetector()), logging.getLogger("evaluator"))
+    params = {"my_cards": [[14, 1], [14, 2]], "board": []}
+    responses = server.process_batch([
+        {"id": 1, "method": "hand_strength", "params": params},
+        {"id": 2, "method": "hand_strength", "params": params, "deadline": time.time() - 1},
+        {"id": 3, "method": "unknown", "params": {}},
+    ])
+    assert [response["id"] for response in responses] == [1, 2, 3]
+    assert 0 <= responses[0]["result"] <= 1
+    assert "error" in responses[1] and "error" in responses[2]
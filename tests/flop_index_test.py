@@ -0,0 +1,27 @@
+from virtual_player.card import Card
+from virtual_player.flop_index import FlopIndex, canonical_flops, texture
+
+
+def test_canonical_flops():
+    assert len(canonical_flops()) == 1755
+
+
+def test_texture():
+    # Ace, king and queen of spades
+    features = dict(zip(FlopIndex.TEXTURE, texture((56, 52, 48))))
+    assert features["paired"] == 0
+    assert features["suits"] == 1 and features["max_suit"] == 3
+    assert features["high_rank"] == 14 and features["broadway"] == 3
+    assert features["straights"] == 1
+
+
+def test_flop_index(tmpdir):
+    path = str(tmpdir.join("flops.bin"))
+    flop = [Card(14, 1), Card(9, 1), Card(4, 2)]
+    FlopIndex.build(path, num_runouts=2, flops=[[int(card) for card in flop]])
+    index = FlopIndex(path)
+    # Same flop with other suits
+    flop = [Card(4, 0), Card(14, 3), Card(9, 3)]
+    assert index.texture(flop)["suits"] == 2
+    assert index.bucket(flop, [Card(9, 1), Card(9, 2)]) > index.bucket(flop, [Card(7, 1), Card(2, 2)])
+    assert 0 <= index.bucket(flop, [Card(14, 1), Card(13, 2)]) < index.num_buckets
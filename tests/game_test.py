@@ -0,0 +1,43 @@
+from virtual_player.game import GamePlayers
+from virtual_player.player import Player
+
+
+def create_players():
+    return GamePlayers([Player(id=player_id, name=player_id, money=100.0) for player_id in ["a", "b", "c", "d"]])
+
+
+def test_get_next_and_previous_skip_folders():
+    players = create_players()
+    players.fold("b")
+    assert players.get_next("a").id == "c"
+    assert players.get_next("d").id == "a"
+    assert players.get_previous("c").id == "a"
+    assert players.get_previous("a").id == "d"
+
+
+def test_get_next_returns_none_for_last_active_player():
+    players = create_players()
+    for player_id in ["a", "b", "d"]:
+        players.fold(player_id)
+    assert players.get_next("c") is None
+    assert players.get_previous("c") is None
+
+
+def test_round_stops_after_one_lap():
+    players = create_players()
+    players.fold("c")
+    assert [player.id for player in players.round("b")] == ["b", "d", "a"]
+    assert [player.id for player in players.round("b", reverse=True)] == ["b", "a", "d"]
+
+
+def test_restore_snapshot():
+    players = create_players()
+    snapshot = players.snapshot()
+    players.get("a").take_money(40.0)
+    players.remove("b")
+    players.fold("c")
+    assert players.count_active() == 2
+    players.restore(snapshot)
+    assert players.get("a").money == 100.0
+    assert [player.id for player in players.active] == ["a", "b", "c", "d"]
+    assert players.dead == []
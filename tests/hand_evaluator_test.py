@@ -1,8 +1,151 @@
+from itertools import combinations
+
 from virtual_player.card import Card
-from virtual_player.score_detector import HandEvaluator, HoldemPokerScoreDetector
+from virtual_player.hand_ranks import FastHoldemPokerScoreDetector, FastOmahaPokerScoreDetector
+from virtual_player.score_detector import HandEvaluator, HoldemPokerScore, HoldemPokerScoreDetector, \
+    OmahaHandEvaluator, OmahaPokerScoreDetector
 
 
 def test_hand_strength_gives_number_between_0_and_1():
     my_card = [Card(4, 1), Card(3, 0)]
     board = [Card(14, 0), Card(9, 3), Card(12, 2)]
     assert 0 <= HandEvaluator(HoldemPokerScoreDetector()).hand_strength(my_card, board) <= 1
+
+
+def test_hand_potential_of_a_flush_draw():
+    my_cards = [Card(14, 3), Card(13, 3)]
+    board = [Card(7, 3), Card(2, 3), Card(9, 1)]
+    potential = HandEvaluator(FastHoldemPokerScoreDetector()).hand_potential(my_cards, board)
+    assert potential.ppot > 0.2
+    assert len(potential.distribution) == 47
+    assert potential.effective_strength > potential.strength
+
+
+def test_hand_potential_of_a_set():
+    my_cards = [Card(9, 0), Card(9, 2)]
+    board = [Card(9, 1), Card(2, 3), Card(13, 1)]
+    potential = HandEvaluator(FastHoldemPokerScoreDetector()).hand_potential(my_cards, board)
+    assert potential.strength > 0.95
+    assert potential.npot < 0.05
+
+
+def test_hand_potential_many_matches_hand_potential():
+    board = [Card(7, 3), Card(2, 3), Card(9, 1)]
+    hands = [([Card(14, 3), Card(13, 3)], board), ([Card(9, 0), Card(9, 2)], board)]
+    hand_evaluator = HandEvaluator(FastHoldemPokerScoreDetector())
+    for (my_cards, board), potential in zip(hands, hand_evaluator.hand_potential_many(hands)):
+        expected = hand_evaluator.hand_potential(my_cards, board)
+        assert (potential.strength, potential.ppot, potential.npot, potential.distribution) == \
+            (expected.strength, expected.ppot, expected.npot, expected.distribution)
+
+
+def test_evaluate_case_counts_every_opponent_holding():
+    hand_evaluator = HandEvaluator(FastHoldemPokerScoreDetector())
+    deck = [Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4)]
+    my_cards, board = deck[20:22], [deck[3], deck[17], deck[30], deck[41], deck[50]]
+    opponents_deck = [card for card in deck if card not in my_cards and card not in board]
+    my_score = HoldemPokerScoreDetector().get_score(my_cards + board)
+    wins = len([
+        opponent_cards for opponent_cards in combinations(opponents_deck, 2)
+        if my_score.cmp(HoldemPokerScoreDetector().get_score(list(opponent_cards) + board)) >= 0
+    ])
+    for _ in range(2):
+        # The second evaluation goes through the cached board ranks
+        assert hand_evaluator.evaluate_case(my_cards, board, opponents_deck) == wins / 990.0
+
+
+def test_omaha_score_uses_two_hand_cards():
+    # Four hearts in the hand and one on the board: no flush in Omaha
+    hand = [Card(14, 3), Card(13, 3), Card(4, 3), Card(3, 3)]
+    board = [Card(9, 3), Card(9, 0), Card(7, 1), Card(2, 2), Card(11, 0)]
+    score = OmahaPokerScoreDetector().get_score(hand + board)
+    assert score.category == HoldemPokerScore.PAIR
+    assert FastOmahaPokerScoreDetector().get_rank(hand + board) == score.strength
+
+
+def test_omaha_hand_ranked_on_many_boards():
+    detector = FastOmahaPokerScoreDetector()
+    hand = [Card(14, 3), Card(13, 3), Card(9, 1), Card(3, 0)]
+    deck = [card for card in (Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4)) if card not in hand]
+    omaha_hand = detector.get_hand(hand)
+    for start in range(0, 40, 5):
+        board = deck[start:start + 5]
+        assert detector.get_rank_on_board(detector.get_board(board), omaha_hand) == \
+            OmahaPokerScoreDetector().get_score(hand + board).strength
+
+
+def test_omaha_hand_strength_gives_number_between_0_and_1():
+    my_cards = [Card(14, 3), Card(13, 3), Card(4, 1), Card(3, 0)]
+    board = [Card(14, 0), Card(9, 3), Card(12, 2)]
+    assert 0 <= OmahaHandEvaluator(FastOmahaPokerScoreDetector()).hand_strength(my_cards, board) <= 1
+
+
+def test_seeded_hand_strength_is_reproducible():
+    my_cards = [Card(4, 1), Card(3, 0)]
+    board = [Card(14, 0), Card(9, 3), Card(12, 2)]
+    for sampling in [HandEvaluator.SAMPLING_UNIFORM, HandEvaluator.SAMPLING_STRATIFIED]:
+        strengths = [
+            HandEvaluator(FastHoldemPokerScoreDetector(), seed=7, sampling=sampling).hand_strength(my_cards, board)
+            for _ in range(2)
+        ]
+        assert strengths[0] == strengths[1]
+
+
+def test_stratified_boards_do_not_repeat_cards_within_a_pass():
+    board = [Card(14, 0), Card(9, 3), Card(12, 2), Card(2, 2)]
+    deck = [card for card in (Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4)) if card not in board]
+    boards = HandEvaluator(FastHoldemPokerScoreDetector(), seed=1).virtual_boards(board, deck)
+    rivers = [int(next(boards)[0][-1]) for _ in range(len(deck))]
+    assert sorted(rivers) == sorted(int(card) for card in deck)
+
+
+def test_hand_strength_many():
+    river = [Card(14, 0), Card(9, 3), Card(12, 2), Card(2, 2), Card(7, 1)]
+    hands = [
+        ([Card(4, 1), Card(3, 0)], [Card(14, 0), Card(9, 3), Card(12, 2)]),
+        ([Card(14, 1), Card(14, 2)], []),
+        ([Card(10, 1), Card(11, 1)], river),
+    ]
+    hand_evaluator = HandEvaluator(FastHoldemPokerScoreDetector(), seed=3)
+    hand_strengths = hand_evaluator.hand_strength_many(hands)
+    assert len(hand_strengths) == 3
+    assert all(0 <= hand_strength <= 1 for hand_strength in hand_strengths)
+    assert hand_strengths[1] > 0.7
+    # The river is evaluated exactly
+    assert hand_strengths[2] == hand_evaluator.hand_strength([Card(10, 1), Card(11, 1)], river)
+
+
+def test_hand_strength_many_shares_the_boards_of_a_group():
+    board = [Card(14, 0), Card(9, 3), Card(12, 2), Card(2, 2)]
+    hands = [([Card(rank, 1), Card(rank, 3)], board) for rank in range(3, 8)]
+    hand_evaluator = HandEvaluator(FastHoldemPokerScoreDetector(), seed=3)
+    hand_strengths = hand_evaluator.hand_strength_many(hands)
+    assert all(0 <= hand_strength <= 1 for hand_strength in hand_strengths)
+    # Every river is drawn for the whole group, rather than 10 per hand
+    assert len(hand_evaluator._board_ranks) < 2 * HandEvaluator.MAX_SIMULATIONS
+
+
+def test_hand_strength_many_expired_deadlines():
+    hands = [([Card(14, 1), Card(14, 2)], []), ([Card(4, 1), Card(3, 0)], [])]
+    hand_strengths = HandEvaluator(FastHoldemPokerScoreDetector(), seed=3).hand_strength_many(
+        hands,
+        deadlines=[0.0, 0.0]
+    )
+    # A single simulation each, but still an estimate for every hand
+    assert all(0 <= hand_strength <= 1 for hand_strength in hand_strengths)
+
+
+def test_omaha_river_strength_averages_opponent_samples():
+    hand_evaluator = OmahaHandEvaluator(FastOmahaPokerScoreDetector(), seed=1)
+    evaluate_case = hand_evaluator.evaluate_case
+    cases = []
+
+    def counting_evaluate_case(*args):
+        cases.append(args)
+        return evaluate_case(*args)
+
+    hand_evaluator.evaluate_case = counting_evaluate_case
+    my_cards = [Card(14, 3), Card(13, 3), Card(4, 1), Card(3, 0)]
+    board = [Card(14, 0), Card(9, 3), Card(12, 2), Card(2, 2), Card(7, 1)]
+    assert 0 <= hand_evaluator.hand_strength(my_cards, board) <= 1
+    assert len(cases) == OmahaHandEvaluator.MAX_SIMULATIONS
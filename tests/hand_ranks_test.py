@@ -0,0 +1,31 @@
+import random
+
+from virtual_player.card import Card
+from virtual_player.hand_ranks import get_hand_ranks
+from virtual_player.score_detector import HoldemPokerScoreDetector
+
+
+def cards(*dtos):
+    return [Card(rank, suit) for rank, suit in dtos]
+
+
+def test_ranks_match_score_strengths():
+    detector = HoldemPokerScoreDetector()
+    deck = [Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4)]
+    rand = random.Random(1)
+    for _ in range(1000):
+        hand = rand.sample(deck, rand.choice([2, 5, 6, 7]))
+        assert get_hand_ranks().rank([int(card) for card in hand]) == detector.get_score(hand).strength
+
+
+def test_full_house_from_two_trips():
+    hand = cards((5, 0), (5, 1), (5, 2), (9, 0), (9, 1), (9, 2), (2, 3))
+    assert HoldemPokerScoreDetector().get_score(hand).category == 6
+    assert get_hand_ranks().rank([int(card) for card in hand]) == HoldemPokerScoreDetector().get_score(hand).strength
+
+
+def test_wheel_straight_flush_beats_quads():
+    straight_flush = cards((14, 0), (2, 0), (3, 0), (4, 0), (5, 0), (9, 1), (9, 2))
+    quads = cards((9, 0), (9, 1), (9, 2), (9, 3), (5, 0), (14, 1), (13, 2))
+    hand_ranks = get_hand_ranks()
+    assert hand_ranks.rank([int(card) for card in straight_flush]) > hand_ranks.rank([int(card) for card in quads])
@@ -0,0 +1,70 @@
+import logging
+import threading
+
+from virtual_player.bet_strategy import HoldemPlayerClient, RandomBetStrategy
+from virtual_player.loadgen import LatencyHistogram, LoadGenerator, LoadMetrics, MeasuringConnector
+from virtual_player.local_dealer import LocalConnector, LocalDealer
+from virtual_player.player import Player
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    for n in range(1, 1001):
+        histogram.record(n / 1000.0)
+    assert histogram.count == 1000
+    assert 0.5 <= histogram.percentile(50) <= 0.5 * 1.1
+    assert 0.99 <= histogram.percentile(99) <= 0.99 * 1.1
+    assert histogram.percentile(99.9) == histogram.max == 1.0
+    assert LatencyHistogram().percentile(50) is None
+
+
+def test_local_dealer_session():
+    metrics = LoadMetrics()
+    logger = logging.getLogger("bot")
+    connector = MeasuringConnector(LocalConnector(LocalDealer(games_per_session=3, seed=1), logger), metrics)
+    HoldemPlayerClient(connector, Player("bot", "Bot", 1000.0), RandomBetStrategy(2, 7, 1), logger).play()
+    report = metrics.report()
+    assert report["counters"]["games"] == 3
+    assert report["counters"]["sessions"] == 1
+    assert report["latencies"]["handshake"]["count"] == 1
+    assert report["latencies"]["bet_response"]["count"] == report["counters"]["decisions"] > 0
+    # One ping per game
+    assert report["latencies"]["ping_interval"]["count"] == 2
+
+
+def test_stopped_bots_do_not_prewarm():
+    prewarmed = []
+
+    class PrewarmConnector:
+        def prewarm(self, player):
+            prewarmed.append(player.id)
+
+    stop = threading.Event()
+    connector = MeasuringConnector(PrewarmConnector(), LoadMetrics(), stop)
+    connector.prewarm(Player("bot", "Bot", 1000.0))
+    stop.set()
+    connector.prewarm(Player("bot", "Bot", 1000.0))
+    assert prewarmed == ["bot"]
+
+
+def test_load_generator():
+    dealer = LocalDealer(games_per_session=2)
+    load_generator = LoadGenerator(lambda logger: LocalConnector(dealer, logger), logging.getLogger("loadgen"))
+    reports = load_generator.run({
+        "phases": [
+            {"name": "ramp-up", "bots": 5, "ramp_up": 0.1, "duration": 0.2},
+            {"name": "down", "bots": 2, "duration": 0.2},
+        ]
+    })
+    assert [(report["phase"], report["bots"]) for report in reports] == [("ramp-up", 5), ("down", 2)]
+    assert all(report["counters"]["games"] > 0 for report in reports)
+    assert reports[0]["counters"]["errors"] == 0
+    assert load_generator.running_bots() == 0
+
+
+def test_stopped_bots_leave_their_session():
+    # Slow dealer: sessions last much longer than the test
+    dealer = LocalDealer(games_per_session=100, delay=0.01)
+    load_generator = LoadGenerator(lambda logger: LocalConnector(dealer, logger), logging.getLogger("loadgen"))
+    load_generator.run({"phases": [{"name": "short", "bots": 3, "duration": 0.1}]})
+    assert load_generator.running_bots() == 0
@@ -0,0 +1,73 @@
+from virtual_player.opponent_stats import OpponentStatsTracker
+
+
+def test_preflop_stats():
+    tracker = OpponentStatsTracker(decay=1.0)
+    for bet_types in [["blind", "raise", "raise"], ["call"], ["check"], ["blind"]]:
+        tracker.new_hand(["p1"])
+        for bet_type in bet_types:
+            tracker.bet("p1", bet_type, preflop=True)
+    stats = tracker.get("p1")
+    assert stats.hands == 4
+    assert stats.vpip == 0.5
+    assert stats.pfr == 0.25
+    assert stats.aggression_factor == 2.0
+
+
+def test_decay():
+    tracker = OpponentStatsTracker(decay=0.5)
+    tracker.new_hand(["p1"])
+    tracker.bet("p1", "raise", preflop=True)
+    tracker.new_hand(["p1"])
+    tracker.showdown("p1", 0.5)
+    stats = tracker.get("p1")
+    assert stats.hands == 1.5
+    assert stats.pfr == 0.5 / 1.5
+    assert stats.average_showdown_strength == 0.5
+
+
+def test_lru_cap():
+    tracker = OpponentStatsTracker(max_opponents=2)
+    tracker.new_hand(["p1", "p2"])
+    tracker.new_hand(["p1", "p3"])
+    assert len(tracker) == 2
+    assert "p2" not in tracker and "p1" in tracker and "p3" in tracker
+
+
+def test_evicted_opponents_are_not_saved(tmpdir):
+    path = str(tmpdir.join("opponents.json"))
+    tracker = OpponentStatsTracker(max_opponents=2)
+    for n in range(1000):
+        tracker.new_hand(["p{}".format(n)])
+    assert len(tracker._updated) == 2
+    tracker.save(path)
+    assert len(OpponentStatsTracker.load(path)) == 2
+
+
+def test_save_and_load(tmpdir):
+    path = str(tmpdir.join("opponents.json"))
+    tracker = OpponentStatsTracker(decay=0.9)
+    tracker.new_hand(["p1", "p2", "p3"])
+    tracker.bet("p2", "call", preflop=True)
+    tracker.save(path)
+    loaded = OpponentStatsTracker.load(path, max_opponents=2)
+    assert loaded.decay == 0.9
+    assert "p1" not in loaded
+    assert loaded.get("p2").dto() == tracker.get("p2").dto()
+
+
+def test_saves_of_several_workers_are_merged(tmpdir):
+    path = str(tmpdir.join("opponents.json"))
+    tracker = OpponentStatsTracker()
+    tracker.new_hand(["p1"])
+    tracker.save(path)
+    workers = [OpponentStatsTracker.load(path), OpponentStatsTracker.load(path)]
+    workers[0].new_hand(["p1", "p2"])
+    workers[1].new_hand(["p3"])
+    for worker in workers:
+        worker.save(path)
+    loaded = OpponentStatsTracker.load(path)
+    assert len(loaded) == 3
+    # p1 was only updated by the first worker, the stale copy of the second one is not saved
+    assert loaded.get("p1").dto() == workers[0].get("p1").dto()
+    assert loaded.get("p3").dto() == workers[1].get("p3").dto()
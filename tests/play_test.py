@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import time
+
+SUPERVISOR = """
+import logging
+import play
+
+
+class HandRanks(object):
+    size = 0
+
+
+def play_forever():
+    raise RuntimeError("Crashing at startup")
+
+
+logging.basicConfig(level=logging.INFO)
+play.get_hand_ranks = HandRanks
+play.play_forever = play_forever
+play.RESTART_DELAY = 0.1
+play.supervise(1)
+"""
+
+
+def test_supervisor_restarts_workers_crashing_at_startup():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    supervisor = subprocess.Popen(
+        [sys.executable, "-c", SUPERVISOR],
+        cwd=root,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    try:
+        time.sleep(3.0)
+        # Still supervising, between the restarts no worker is running
+        assert supervisor.poll() is None
+    finally:
+        supervisor.terminate()
+        _, log = supervisor.communicate()
+    assert "ChildProcessError" not in log
+    assert log.count("died") >= 2
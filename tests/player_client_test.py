@@ -0,0 +1,140 @@
+import collections
+import json
+import logging
+
+import pytest
+
+from virtual_player.bet_strategy import HoldemPlayerClient, RandomBetStrategy
+from virtual_player.channel import MessageFormatError, MessageTimeout
+from virtual_player.channel_recorder import MessageLog
+from virtual_player.channel_redis import ChannelRedis
+from virtual_player.player import Player
+from virtual_player.player_client import PlayerClientConnector, ReplayConnector
+
+
+class ListsRedis:
+    """In memory stand-in for the Redis list commands used by the channels."""
+    def __init__(self):
+        self.lists = collections.defaultdict(collections.deque)
+
+    def lpush(self, name, value):
+        self.lists[name].appendleft(value)
+
+    def rpop(self, name):
+        return self.lists[name].pop() if self.lists[name] else None
+
+    def expire(self, name, seconds):
+        pass
+
+
+def accept(redis, server_id):
+    """Accepts the oldest connection request of the lobby, as the server would."""
+    request = json.loads(redis.rpop("lobby").decode("utf-8"))
+    redis.lpush(
+        "poker5:player-{}:session-{}:O".format(request["player"]["id"], request["session_id"]),
+        json.dumps({"message_type": "connect", "server_id": server_id}).encode("utf-8")
+    )
+    return request
+
+
+def test_connect():
+    redis = ListsRedis()
+    connector = PlayerClientConnector(redis, "lobby", logging.getLogger("connector"))
+    player = Player("hal-1", "Hal", 1000.0)
+    redis.lpush(
+        "poker5:player-hal-1:session-s1:O",
+        json.dumps({"message_type": "connect", "server_id": "srv"}).encode("utf-8")
+    )
+    assert connector.connect(player, "s1").connection_message["server_id"] == "srv"
+    assert json.loads(redis.rpop("lobby").decode("utf-8"))["session_id"] == "s1"
+
+
+def test_channel_closed_on_failed_handshake():
+    closed = []
+
+    class ClosingChannel(ChannelRedis):
+        def close(self):
+            closed.append(self)
+            super(ClosingChannel, self).close()
+
+    redis = ListsRedis()
+    connector = PlayerClientConnector(redis, "lobby", logging.getLogger("connector"), channel_factory=ClosingChannel)
+    redis.lpush(
+        "poker5:player-hal-1:session-s1:O",
+        json.dumps({"message_type": "error", "error": "Lobby full"}).encode("utf-8")
+    )
+    with pytest.raises(MessageFormatError):
+        connector.connect(Player("hal-1", "Hal", 1000.0), "s1")
+    assert len(closed) == 1
+
+
+def test_prewarmed_session():
+    redis = ListsRedis()
+    connector = PlayerClientConnector(redis, "lobby", logging.getLogger("connector"))
+    player = Player("hal-1", "Hal", 1000.0)
+    connector.prewarm(player)
+    request = accept(redis, "srv")
+    client = connector.connect(player, "ignored")
+    assert client.connection_message["server_id"] == "srv"
+    # The prewarmed request was the only one sent
+    assert not redis.lists["lobby"]
+    assert request["player"]["id"] == "hal-1"
+
+
+class ScriptedConnector:
+    """Connector of a single session replaying a list of server messages, recording the prewarm requests."""
+    def __init__(self, messages):
+        self.messages = collections.deque(messages)
+        self.prewarmed = []
+
+    def prewarm(self, player):
+        # Server messages left when prewarming
+        self.prewarmed.append(len(self.messages))
+
+    def connect(self, player, session_id):
+        return self
+
+    def recv_message(self, timeout_epoch=None):
+        return self.messages.popleft()
+
+    def send_message(self, message):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_rejoin_is_prewarmed_when_out_of_money():
+    player = Player("hal-1", "Hal", 1000.0)
+    connector = ScriptedConnector([
+        {"message_type": "game-update", "event": "new-game", "game_id": "g1", "big_blind": 10.0, "small_blind": 5.0,
+         "players": [{"id": "hal-1", "name": "Hal", "money": 10.0}, {"id": "p2", "name": "P2", "money": 990.0}]},
+        {"message_type": "game-update", "event": "bet", "player": {"id": "hal-1"}, "bet": 10.0, "bet_type": "blind"},
+        {"message_type": "game-update", "event": "game-over"},
+        {"message_type": "disconnect"},
+    ])
+    HoldemPlayerClient(connector, player, RandomBetStrategy(), logging.getLogger("bot"), rejoin=True).play()
+    # Requested at the end of the game, not again when disconnected
+    assert connector.prewarmed == [1]
+
+
+def test_replay_of_every_recorded_session(tmpdir):
+    path = str(tmpdir.join("bot.log"))
+    message_log = MessageLog(path)
+    message_log.append(MessageLog.SENT, {
+        "message_type": "connect",
+        "player": {"id": "hal-1", "name": "Hal", "money": 1000.0}
+    })
+    for session in ("s1", "s2"):
+        message_log.append(MessageLog.RECEIVED, {"message_type": "connect", "server_id": session})
+        message_log.append(MessageLog.RECEIVED, {"message_type": "disconnect"})
+    message_log.close()
+
+    connector = ReplayConnector(path, logging.getLogger("replay"))
+    player = connector.recorded_player()
+    for session in ("s1", "s2"):
+        client = connector.connect(player, None)
+        assert client.connection_message["server_id"] == session
+        assert client.recv_message()["message_type"] == "disconnect"
+    with pytest.raises(MessageTimeout):
+        connector.connect(player, None)
@@ -0,0 +1,25 @@
+import pstats
+
+from virtual_player.profiling import DecisionProfiler
+
+
+def decide(bet):
+    return bet
+
+
+def test_profiler_is_transparent_when_not_armed(tmpdir):
+    profiler = DecisionProfiler(str(tmpdir))
+    assert profiler.profile("hal-1", 0, decide, 10.0) == 10.0
+    assert tmpdir.listdir() == []
+
+
+def test_profiler_dumps_stats_by_bot_and_street(tmpdir):
+    profiler = DecisionProfiler(str(tmpdir), num_decisions=3)
+    profiler.arm()
+    for street in [0, 1, 1]:
+        assert profiler.profile("hal-1", street, decide, bet=5.0) == 5.0
+    assert not profiler.armed
+    paths = sorted(str(path) for path in tmpdir.listdir())
+    assert len(paths) == 2
+    assert ".flop." in paths[0] and ".preflop." in paths[1]
+    assert any(function[2] == "decide" for function in pstats.Stats(paths[0]).stats)
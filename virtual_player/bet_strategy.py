@@ -1,4 +1,5 @@
 import bisect
+import collections
 import math
 import random
 import time
@@ -6,9 +7,11 @@ import uuid
 
 from virtual_player.card import Card
 from virtual_player.channel import MessageTimeout
+from virtual_player.evaluator_service import EvaluatorError, RemoteHandEvaluator
 from virtual_player.game import GamePlayers, GameScores
+from virtual_player.hand_ranks import FastHoldemPokerScoreDetector, FastOmahaPokerScoreDetector
 from virtual_player.player import Player
-from virtual_player.score_detector import HoldemPokerScoreDetector, HandEvaluator
+from virtual_player.score_detector import HoldemPokerScoreDetector, HandEvaluator, OmahaHandEvaluator
 
 
 class CardsFormatter:
@@ -43,7 +46,10 @@ class HoldemGameState:
     STATE_TURN = 2
     STATE_RIVER = 3
 
-    def __init__(self, players, scores, pot, big_blind, small_blind):
+    def __init__(self, players, scores, pot, big_blind, small_blind, game_id=None, opponent_stats=None):
+        self.game_id = game_id
+        # Statistics of the opponents (OpponentStatsTracker), if tracked
+        self.opponent_stats = opponent_stats
         self.players = players
         self.scores = scores
         self.pot = pot
@@ -65,19 +71,35 @@ class HoldemGameState:
 
 
 class HoldemPlayerClient:
-    def __init__(self, player_connector, player, bet_strategy, logger):
+    def __init__(self, player_connector, player, bet_strategy, logger, score_detector=None, decision_log=None,
+                 opponent_stats=None, rejoin=False, hand_evaluator=None):
         self._player_connector = player_connector
         self._player = player
         self._bet_strategy = bet_strategy
         self._logger = logger
+        self._score_detector = score_detector if score_detector is not None else HoldemPokerScoreDetector()
+        self._decision_log = decision_log
+        self._opponent_stats = opponent_stats
+        # Hand evaluator of the game (HandEvaluator by default) rating the hands shown down for the opponent stats
+        self._hand_evaluator = hand_evaluator
+        # Whether to request the next session (see PlayerClientConnector.prewarm()) as soon as disconnected
+        self._rejoin = rejoin
 
     def play(self):
         # Connecting the player
         server_channel = self._player_connector.connect(player=self._player, session_id=str(uuid.uuid4()))
+        try:
+            self._play(server_channel)
+        finally:
+            server_channel.close()
 
+    def _play(self, server_channel):
         cards_formatter = CardsFormatter(compact=True)
 
         game_state = None
+        initial_money = None
+        # Whether the next session has been requested already
+        prewarmed = False
 
         while True:
             try:
@@ -89,6 +111,8 @@ class HoldemPlayerClient:
             else:
                 if message["message_type"] == "disconnect":
                     self._logger.warning("Disconnected from the server")
+                    if self._rejoin and not prewarmed:
+                        self._player_connector.prewarm(self._player)
                     break
 
                 elif message["message_type"] == "ping":
@@ -104,14 +128,33 @@ class HoldemPlayerClient:
                                 Player(id=player["id"], name=player["name"], money=player["money"])
                                 for player in message["players"]
                             ]),
-                            scores=GameScores(HoldemPokerScoreDetector()),
+                            scores=GameScores(self._score_detector),
                             pot=0.0,
                             big_blind=message["big_blind"],
-                            small_blind=message["small_blind"]
+                            small_blind=message["small_blind"],
+                            game_id=message["game_id"],
+                            opponent_stats=self._opponent_stats
                         )
+                        if self._opponent_stats is not None:
+                            self._opponent_stats.new_hand(
+                                player["id"] for player in message["players"] if player["id"] != self._player.id
+                            )
+                        initial_money = game_state.players.get(self._player.id).money
                         self._logger.info("New game: {}".format(message["game_id"]))
 
                     elif message["event"] == "game-over":
+                        if self._decision_log and game_state:
+                            self._decision_log.log_hand(
+                                bot_id=self._player.id,
+                                hand_id=game_state.game_id,
+                                profit=game_state.players.get(self._player.id).money - initial_money
+                            )
+                        if self._rejoin and not prewarmed and game_state \
+                                and game_state.players.get(self._player.id).money <= 0:
+                            # Out of money, the server is about to drop the player: the next session is requested
+                            # meanwhile
+                            self._player_connector.prewarm(self._player)
+                            prewarmed = True
                         game_state = None
                         self._logger.info("Game over")
 
@@ -124,6 +167,8 @@ class HoldemPlayerClient:
                         for player_id in message["players"]:
                             cards = [Card(card[0], card[1]) for card in message["players"][player_id]["cards"]]
                             game_state.scores.assign_cards(player_id, cards)
+                            if self._opponent_stats is not None and player_id != self._player.id:
+                                self._showdown(player_id, cards, game_state.scores.shared_cards)
                             self._logger.info("Player {} cards: {}".format(
                                 game_state.players.get(player_id),
                                 cards_formatter.format(cards))
@@ -144,6 +189,7 @@ class HoldemPlayerClient:
                     elif message["event"] == "player-action" and message["action"] == "bet":
                         if message["player"]["id"] == self._player.id:
                             self._logger.info("My turn to bet".format(self._player))
+                            decision_time = time.time()
                             bet = self._bet_strategy.bet(
                                 me=self._player,
                                 game_state=game_state,
@@ -152,6 +198,21 @@ class HoldemPlayerClient:
                                 bets=message["bets"]
                             )
 
+                            if self._decision_log:
+                                self._decision_log.log_decision(
+                                    bot_id=self._player.id,
+                                    hand_id=game_state.game_id,
+                                    street=game_state.state,
+                                    hole=game_state.scores.player_cards(self._player.id),
+                                    board=game_state.scores.shared_cards,
+                                    pot=game_state.pot + sum(message["bets"].values()),
+                                    min_bet=message["min_bet"],
+                                    max_bet=message["max_bet"],
+                                    equity=self._bet_strategy.last_hand_strength,
+                                    bet=bet,
+                                    latency=time.time() - decision_time
+                                )
+
                             choice = "Fold" if bet == -1 \
                                 else ("Call ({:.2f})" if bet == message["min_bet"] else "Raise (${:.2f})").format(bet)
 
@@ -170,6 +231,12 @@ class HoldemPlayerClient:
                     elif message["event"] == "bet":
                         player = game_state.players.get(message["player"]["id"])
                         player.take_money(message["bet"])
+                        if self._opponent_stats is not None and player.id != self._player.id:
+                            self._opponent_stats.bet(
+                                player.id,
+                                message["bet_type"],
+                                preflop=game_state.state == HoldemGameState.STATE_PREFLOP
+                            )
                         self._logger.info("Player {} bet ${:.2f} ({})".format(
                             player,
                             message["bet"],
@@ -200,7 +267,26 @@ class HoldemPlayerClient:
                     self._logger.error("Message type {} not recognised".format(message["message_type"]))
 
 
+    def _showdown(self, player_id, cards, board):
+        # Hands shown are rated by their equity against a random holding
+        if self._hand_evaluator is None:
+            self._hand_evaluator = HandEvaluator(self._score_detector)
+        try:
+            strength = self._hand_evaluator.hand_strength(cards, board)
+        except EvaluatorError as e:
+            self._logger.warning("Unable to rate the hand of {}: {}".format(player_id, e))
+        else:
+            self._opponent_stats.showdown(player_id, strength)
+
+
+# Pending decision of a table, see SmartBetStrategy.bet_many()
+BetDecision = collections.namedtuple("BetDecision", ["me", "game_state", "bets", "min_bet", "max_bet", "deadline"])
+
+
 class RandomBetStrategy:
+    # Random decisions do not depend on the hand strength
+    last_hand_strength = None
+
     def __init__(self, fold_cases=2, call_cases=5, raise_cases=3):
         self.bet_cases = (["fold"] * fold_cases) + (["call"] * call_cases) + (["raise"] * raise_cases)
 
@@ -218,9 +304,22 @@ class RandomBetStrategy:
 
 
 class SmartBetStrategy:
-    def __init__(self, hand_evaluator, logger):
+    # Seconds evaluating locally before trying an unavailable evaluator service again
+    EVALUATOR_RETRY_DELAY = 60.0
+
+    def __init__(self, hand_evaluator, logger, flop_index=None, local_hand_evaluator=None):
         self.hand_evaluator = hand_evaluator
         self.logger = logger
+        # Factory of the HandEvaluator used while hand_evaluator (an evaluator service) is unavailable
+        self.local_hand_evaluator = local_hand_evaluator
+        self._local_hand_evaluator = None
+        self._evaluator_retry = 0.0
+        # Precomputed flop textures and hand class buckets (FlopIndex), Hold'em only
+        self.flop_index = flop_index
+        # Hand strength the last decision was based on
+        self.last_hand_strength = None
+        # Flop texture and hand class bucket of the last postflop decision (if a flop index is available)
+        self.last_flop_features = None
 
     @staticmethod
     def choice(population, weights):
@@ -253,13 +352,125 @@ class SmartBetStrategy:
         self.logger.info("Min bet: ${:.2f} - Max bet: ${:.2f}".format(min_bet, max_bet))
         self.logger.info("Pots: ${:.2f}".format(game_pot))
 
-        hand_strength = self.hand_evaluator.hand_strength(
+        if game_state.opponent_stats is not None:
+            for player in game_state.players.active:
+                stats = game_state.opponent_stats.get(player.id)
+                if player.id != me.id and stats is not None and stats.hands:
+                    self.logger.info("Player {}: {:.0f} hands, VPIP {:.0%}, PFR {:.0%}, AF {}".format(
+                        player,
+                        stats.hands,
+                        stats.vpip,
+                        stats.pfr,
+                        "-" if stats.aggression_factor is None else "{:.1f}".format(stats.aggression_factor)
+                    ))
+
+        hand_strength = self._evaluate(
+            "hand_strength",
             my_cards=game_state.scores.player_cards(me.id),
             board=game_state.scores.shared_cards
         )
 
         self.logger.info("HAND STRENGTH: {}".format(hand_strength))
 
+        self.last_flop_features = self._flop_features(me, game_state)
+        if self.last_flop_features:
+            self.logger.info("FLOP: {}".format(", ".join(
+                "{} {}".format(feature, value) for feature, value in sorted(self.last_flop_features.items())
+            )))
+
+        hand_strength = self._with_potential(me, game_state, hand_strength)
+
+        return self.decide(hand_strength, game_pot, min_bet, max_bet)
+
+    def bet_many(self, decisions):
+        """
+        Bets for the pending decisions (BetDecision) of several tables at once.
+        The equity of all the hands is computed in one batch, every hand getting as many simulations as
+        possible before its own decision deadline. The potential of the hands on the flop and the turn is
+        computed in one batch as well, and blended in as by bet() unless the deadline has passed before it
+        was known.
+        """
+        hands = [
+            (decision.game_state.scores.player_cards(decision.me.id), decision.game_state.scores.shared_cards)
+            for decision in decisions
+        ]
+        hand_strengths = self._evaluate(
+            "hand_strength_many",
+            hands=hands,
+            deadlines=[decision.deadline for decision in decisions]
+        )
+
+        drawing = [i for i, decision in enumerate(decisions) if SmartBetStrategy._drawing(decision.game_state)]
+        if drawing:
+            effective_strengths = self._evaluate(
+                "effective_strength_many",
+                hands=[hands[i] for i in drawing],
+                deadlines=[decisions[i].deadline for i in drawing]
+            )
+            for i, effective_strength in zip(drawing, effective_strengths):
+                if effective_strength is not None:
+                    hand_strengths[i] = SmartBetStrategy._blend(hand_strengths[i], effective_strength)
+
+        return [
+            self.decide(
+                hand_strength,
+                decision.game_state.pot + sum(decision.bets.values()),
+                decision.min_bet,
+                decision.max_bet
+            )
+            for decision, hand_strength in zip(decisions, hand_strengths)
+        ]
+
+    def _evaluate(self, method, **params):
+        # Calls a method of the hand evaluator, falling back to a local one if the evaluator service fails
+        if self.local_hand_evaluator is None or time.time() >= self._evaluator_retry:
+            try:
+                return getattr(self.hand_evaluator, method)(**params)
+            except EvaluatorError as e:
+                if self.local_hand_evaluator is None:
+                    raise
+                self.logger.warning("Evaluator unavailable ({}): evaluating locally for {:.0f} seconds".format(
+                    e,
+                    self.EVALUATOR_RETRY_DELAY
+                ))
+                self._evaluator_retry = time.time() + self.EVALUATOR_RETRY_DELAY
+        if self._local_hand_evaluator is None:
+            self._local_hand_evaluator = self.local_hand_evaluator()
+        return getattr(self._local_hand_evaluator, method)(**params)
+
+    def _flop_features(self, me, game_state):
+        my_cards = game_state.scores.player_cards(me.id)
+        if self.flop_index is None or len(game_state.scores.shared_cards) < 3 or len(my_cards) != 2:
+            return None
+        flop = game_state.scores.shared_cards[:3]
+        features = self.flop_index.texture(flop)
+        features["bucket"] = self.flop_index.bucket(flop, my_cards)
+        return features
+
+    @staticmethod
+    def _drawing(game_state):
+        # Whether cards are still to come, so that the hand potential matters
+        return game_state.state in (HoldemGameState.STATE_FLOP, HoldemGameState.STATE_TURN)
+
+    @staticmethod
+    def _blend(hand_strength, effective_strength):
+        # Draws are worth more than their current equity, vulnerable made hands less
+        return (hand_strength + effective_strength) / 2.0
+
+    def _with_potential(self, me, game_state, hand_strength):
+        if not SmartBetStrategy._drawing(game_state):
+            return hand_strength
+        effective_strength = self._evaluate(
+            "effective_strength",
+            my_cards=game_state.scores.player_cards(me.id),
+            board=game_state.scores.shared_cards
+        )
+        self.logger.info("HAND POTENTIAL: effective strength {:.2f}".format(effective_strength))
+        return SmartBetStrategy._blend(hand_strength, effective_strength)
+
+    def decide(self, hand_strength, game_pot, min_bet, max_bet):
+        self.last_hand_strength = hand_strength
+
         choices = ["fold", "call", "raise"]
 
         if hand_strength < 0.20:
@@ -303,11 +514,37 @@ class SmartBetStrategy:
         return bet
 
 
+def _smart_bet_strategy(local_hand_evaluator, logger, evaluator_socket, flop_index=None):
+    if evaluator_socket:
+        # The local hand evaluator (and its lookup tables) is only built if the evaluator service fails
+        return SmartBetStrategy(
+            hand_evaluator=RemoteHandEvaluator(evaluator_socket),
+            logger=logger,
+            flop_index=flop_index,
+            local_hand_evaluator=local_hand_evaluator
+        )
+    return SmartBetStrategy(hand_evaluator=local_hand_evaluator(), logger=logger, flop_index=flop_index)
+
+
 BET_STRATEGIES = {
-    "smart": lambda logger: SmartBetStrategy(hand_evaluator=HandEvaluator(HoldemPokerScoreDetector()), logger=logger),
-    "random": lambda logger: RandomBetStrategy(call_cases=7, fold_cases=2, raise_cases=1)
+    "smart": lambda logger, equity_cache, evaluator_socket, flop_index: _smart_bet_strategy(
+        lambda: HandEvaluator(FastHoldemPokerScoreDetector(), equity_cache=equity_cache),
+        logger,
+        evaluator_socket,
+        flop_index
+    ),
+    "smart-omaha": lambda logger, equity_cache, evaluator_socket, flop_index: _smart_bet_strategy(
+        lambda: OmahaHandEvaluator(FastOmahaPokerScoreDetector(), equity_cache=equity_cache),
+        logger,
+        evaluator_socket
+    ),
+    "random": lambda logger, equity_cache, evaluator_socket, flop_index: RandomBetStrategy(
+        call_cases=7,
+        fold_cases=2,
+        raise_cases=1
+    )
 }
 
 
-def stategy_factory(strategy, logger):
-    return BET_STRATEGIES[strategy](logger)
+def stategy_factory(strategy, logger, equity_cache=None, evaluator_socket=None, flop_index=None):
+    return BET_STRATEGIES[strategy](logger, equity_cache, evaluator_socket, flop_index)
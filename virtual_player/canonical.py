@@ -0,0 +1,76 @@
+import itertools
+
+
+RANK_LABELS = "--23456789TJQKA"
+# Suits as in Card.SUITS: spades, clubs, diamonds, hearts
+SUIT_LABELS = "scdh"
+
+SUIT_PERMUTATIONS = list(itertools.permutations(range(4)))
+
+
+def card_label(value):
+    return RANK_LABELS[value >> 2] + SUIT_LABELS[value & 3]
+
+
+def cards_label(values):
+    return "".join(card_label(value) for value in values)
+
+
+def permute_suits(values, permutation):
+    return [(value & ~3) | permutation[value & 3] for value in values]
+
+
+def canonical_board(values):
+    """
+    Canonical representative of a board under suit isomorphism (the order of the cards does not matter):
+    boards that only differ by a permutation of the suits share the same canonical board.
+    """
+    return max(
+        tuple(sorted(permute_suits(values, permutation), reverse=True))
+        for permutation in SUIT_PERMUTATIONS
+    )
+
+
+def _hand_classes():
+    classes = []
+    for high in range(14, 1, -1):
+        classes.append(RANK_LABELS[high] * 2)
+        for low in range(high - 1, 1, -1):
+            classes.append(RANK_LABELS[high] + RANK_LABELS[low] + "s")
+            classes.append(RANK_LABELS[high] + RANK_LABELS[low] + "o")
+    return classes
+
+
+# The 169 preflop hand classes: pairs, suited and offsuit hands, e.g. "AA", "AKs", "AKo", ...
+HAND_CLASSES = _hand_classes()
+HAND_CLASS_INDEX = {label: index for index, label in enumerate(HAND_CLASSES)}
+
+# The 1326 hole card holdings as pairs of card values, highest first
+HOLDINGS = list(itertools.combinations(range(59, 7, -1), 2))
+
+
+def hand_class_label(values):
+    high, low = sorted((value >> 2 for value in values), reverse=True)
+    if high == low:
+        return RANK_LABELS[high] * 2
+    return RANK_LABELS[high] + RANK_LABELS[low] + ("s" if values[0] & 3 == values[1] & 3 else "o")
+
+
+def hand_class(values):
+    """Index in HAND_CLASSES of a two cards holding."""
+    return HAND_CLASS_INDEX[hand_class_label(values)]
+
+
+def canonical_hand(hole, board):
+    """
+    Canonical representative of hole cards and board under suit isomorphism,
+    as a tuple of sorted hole card values and a tuple of sorted board values.
+    """
+    board, hole = max(
+        (
+            tuple(sorted(permute_suits(board, permutation), reverse=True)),
+            tuple(sorted(permute_suits(hole, permutation), reverse=True))
+        )
+        for permutation in SUIT_PERMUTATIONS
+    )
+    return hole, board
@@ -0,0 +1,132 @@
+import json
+import mmap
+import os
+import struct
+import time
+
+from virtual_player.channel import Channel, MessageFormatError, MessageTimeout
+
+
+class MessageLog:
+    """
+    Append-only log of channel traffic.
+    Every record is a fixed header (direction, timestamp, payload length) followed by the JSON payload.
+    """
+    SENT = 0
+    RECEIVED = 1
+
+    HEADER = struct.Struct("<BdI")
+
+    def __init__(self, path):
+        self._file = open(path, "ab")
+
+    def append(self, direction, message, timestamp=None):
+        payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        self._file.write(MessageLog.HEADER.pack(
+            direction,
+            time.time() if timestamp is None else timestamp,
+            len(payload)
+        ))
+        self._file.write(payload)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class MessageLogReader:
+    """
+    Streams the records of a message log through a read-only memory map,
+    so that large captures are never loaded in memory at once.
+    """
+    def __init__(self, path):
+        self._path = path
+
+    def __iter__(self):
+        if not os.path.getsize(self._path):
+            return
+        with open(self._path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                offset = 0
+                while offset + MessageLog.HEADER.size <= len(data):
+                    direction, timestamp, length = MessageLog.HEADER.unpack_from(data, offset)
+                    offset += MessageLog.HEADER.size
+                    if offset + length > len(data):
+                        # Truncated record: the recording process did not flush it completely
+                        break
+                    try:
+                        message = json.loads(data[offset:offset + length].decode("utf-8"))
+                    except ValueError:
+                        raise MessageFormatError(desc="Unable to decode the JSON message")
+                    offset += length
+                    yield direction, timestamp, message
+            finally:
+                data.close()
+
+
+class RecordingChannel(Channel):
+    """Channel decorator that appends all the sent and received messages to a message log."""
+    def __init__(self, channel, message_log):
+        self._channel = channel
+        self._message_log = message_log
+
+    def send_message(self, message):
+        self._channel.send_message(message)
+        self._message_log.append(MessageLog.SENT, message)
+
+    def recv_message(self, timeout_epoch=None):
+        message = self._channel.recv_message(timeout_epoch)
+        self._message_log.append(MessageLog.RECEIVED, message)
+        return message
+
+    def close(self):
+        self._message_log.flush()
+        self._channel.close()
+
+
+class ReplayChannel(Channel):
+    """
+    Feeds the received messages of a recording back to the client.
+    Messages are delivered as fast as possible, or respecting the original timing if real_time is set.
+    Sent messages are discarded.
+    """
+    def __init__(self, path, real_time=False):
+        self._records = iter(MessageLogReader(path))
+        self._real_time = real_time
+        self._first_timestamp = None
+        self._start_time = None
+        self._next_message = None
+        self.sent_messages = 0
+
+    def _next_received(self):
+        for direction, timestamp, message in self._records:
+            if direction == MessageLog.RECEIVED:
+                return timestamp, message
+        return None
+
+    def send_message(self, message):
+        self.sent_messages += 1
+
+    def recv_message(self, timeout_epoch=None):
+        if self._next_message is None:
+            self._next_message = self._next_received()
+            if self._next_message is None:
+                raise MessageTimeout("End of the recording")
+
+        timestamp, message = self._next_message
+
+        if self._real_time:
+            if self._first_timestamp is None:
+                self._first_timestamp = timestamp
+                self._start_time = time.time()
+            delivery_time = self._start_time + timestamp - self._first_timestamp
+            if timeout_epoch is not None and delivery_time > timeout_epoch:
+                time.sleep(max(0.0, timeout_epoch - time.time()))
+                raise MessageTimeout("Timed out")
+            time.sleep(max(0.0, delivery_time - time.time()))
+
+        self._next_message = None
+        return message
@@ -0,0 +1,116 @@
+import collections
+import json
+import threading
+import time
+
+from virtual_player.channel import Channel, MessageFormatError, MessageTimeout, ChannelError
+from virtual_player.channel_redis import RedisError
+
+
+class StreamMultiplexer:
+    """
+    Reads many Redis streams with a single blocking XREAD at a time, dispatching the messages to the
+    channel of each stream: one connection waits on the inbound streams of all the bots of a process.
+    The id of the last message read from each stream is tracked, so reads are ordered and resume where
+    they stopped.
+    """
+    # Longest XREAD block, so that streams registered meanwhile are read soon enough
+    MAX_BLOCK = 0.25
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._condition = threading.Condition()
+        self._last_ids = {}
+        self._messages = {}
+        self._reading = False
+
+    def register(self, stream):
+        with self._condition:
+            if stream not in self._last_ids:
+                # Reading from the start: the first messages may have been sent before registering
+                self._last_ids[stream] = "0"
+                self._messages[stream] = collections.deque()
+
+    def unregister(self, stream):
+        with self._condition:
+            self._last_ids.pop(stream, None)
+            self._messages.pop(stream, None)
+
+    def recv(self, stream, timeout_epoch=None):
+        """Next message of a registered stream."""
+        with self._condition:
+            while True:
+                if self._messages[stream]:
+                    return self._messages[stream].popleft()
+                remaining = None if timeout_epoch is None else timeout_epoch - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise MessageTimeout("Timed out")
+                if self._reading:
+                    # Another thread is reading on behalf of everyone
+                    self._condition.wait(remaining)
+                else:
+                    self._read(StreamMultiplexer.MAX_BLOCK if remaining is None
+                               else min(remaining, StreamMultiplexer.MAX_BLOCK))
+
+    def _read(self, block):
+        # Called holding the lock, which is released while waiting on Redis
+        self._reading = True
+        streams = list(self._last_ids.items())
+        self._condition.release()
+        try:
+            response = self._redis.execute_command(
+                "XREAD", "BLOCK", max(1, int(block * 1000)), "STREAMS",
+                *([name for name, last_id in streams] + [last_id for name, last_id in streams])
+            )
+        except RedisError as ex:
+            raise ChannelError(ex.args[0])
+        finally:
+            self._condition.acquire()
+            self._reading = False
+            self._condition.notify_all()
+
+        for name, entries in response or []:
+            name = name.decode("utf-8")
+            if name not in self._last_ids:
+                # Unregistered meanwhile
+                continue
+            for message_id, fields in entries:
+                self._last_ids[name] = message_id.decode("utf-8")
+                fields = dict(zip(fields[::2], fields[1::2]))
+                try:
+                    self._messages[name].append(json.loads(fields[b"message"].decode("utf-8")))
+                except (KeyError, ValueError):
+                    raise MessageFormatError(desc="Unable to decode the JSON message")
+
+
+class ChannelRedisStream(Channel):
+    """
+    Channel over two Redis streams, trimmed to about max_length messages and expiring when unused.
+    Inbound streams are read by a StreamMultiplexer, possibly shared by many channels.
+    """
+    def __init__(self, redis, channel_in, channel_out, multiplexer=None, max_length=1000, expire=300):
+        self._redis = redis
+        self._stream_in = channel_in
+        self._stream_out = channel_out
+        self._multiplexer = multiplexer if multiplexer is not None else StreamMultiplexer(redis)
+        self._multiplexer.register(channel_in)
+        self._max_length = max_length
+        self._expire = expire
+
+    def send_message(self, message):
+        msg_encoded = json.dumps(message).encode("utf-8")
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            pipeline.execute_command(
+                "XADD", self._stream_out, "MAXLEN", "~", self._max_length, "*", "message", msg_encoded
+            )
+            pipeline.expire(self._stream_out, self._expire)
+            pipeline.execute()
+        except RedisError as e:
+            raise ChannelError(e.args[0])
+
+    def recv_message(self, timeout_epoch=None):
+        return self._multiplexer.recv(self._stream_in, timeout_epoch)
+
+    def close(self):
+        self._multiplexer.unregister(self._stream_in)
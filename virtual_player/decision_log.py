@@ -0,0 +1,240 @@
+import array
+import bisect
+import collections
+import hashlib
+import itertools
+import math
+import operator
+import os
+import struct
+
+
+class ColumnTable:
+    """
+    Append-only columnar table: every column is a file of fixed size values (see array typecodes),
+    some columns holding several values per row (e.g. cards).
+    """
+    def __init__(self, path, columns):
+        # columns: list of (name, typecode, values per row)
+        self._path = path
+        self._columns = columns
+        self._buffers = {name: array.array(typecode) for name, typecode, width in columns}
+        self.rows = 0
+
+    def append(self, **values):
+        for name, typecode, width in self._columns:
+            value = values[name]
+            if width == 1:
+                self._buffers[name].append(value)
+            else:
+                self._buffers[name].extend(value)
+        self.rows += 1
+
+    def flush(self):
+        for name, typecode, width in self._columns:
+            with open(os.path.join(self._path, name), "ab") as f:
+                self._buffers[name].tofile(f)
+            self._buffers[name] = array.array(typecode)
+        self.rows = 0
+
+    @staticmethod
+    def read(path, columns):
+        """Reads all the columns of a table as arrays, dropping the rows not completely written."""
+        data = {}
+        for name, typecode, width in columns:
+            data[name] = array.array(typecode)
+            column_path = os.path.join(path, name)
+            if os.path.exists(column_path):
+                with open(column_path, "rb") as f:
+                    data[name].frombytes(f.read())
+        rows = min(len(data[name]) // width for name, typecode, width in columns)
+        for name, typecode, width in columns:
+            del data[name][rows * width:]
+        return rows, data
+
+
+class DecisionLog:
+    """
+    Structured log of the bot decisions and of the hand results, for offline analysis (see DecisionLogReader).
+
+    Each process appends to its own segment directory, so that bots never write to the same files:
+        <path>/<segment>/strings: dictionary of the bot ids, one per line
+        <path>/<segment>/decisions.<column>, <path>/<segment>/hands.<column>: columns
+    Hand ids are all different, so they are stored as a 64 bits hash (see hand_hash()) rather than in the
+    dictionary, which would grow with every hand.
+    Rows are buffered and written every FLUSH_ROWS rows.
+    """
+    FLUSH_ROWS = 256
+
+    FOLD = 0
+    CALL = 1
+    RAISE = 2
+
+    # Cards are stored as their values (int(card)), 0 for no card
+    DECISION_COLUMNS = [
+        ("decisions.bot", "I", 1),
+        ("decisions.hand_hash", "Q", 1),
+        ("decisions.street", "b", 1),
+        ("decisions.hole", "B", 4),
+        ("decisions.board", "B", 5),
+        ("decisions.pot", "d", 1),
+        ("decisions.min_bet", "d", 1),
+        ("decisions.max_bet", "d", 1),
+        ("decisions.equity", "f", 1),
+        ("decisions.choice", "b", 1),
+        ("decisions.bet", "d", 1),
+        ("decisions.latency", "f", 1),
+    ]
+
+    HAND_COLUMNS = [
+        ("hands.bot", "I", 1),
+        ("hands.hand_hash", "Q", 1),
+        ("hands.profit", "d", 1),
+    ]
+
+    def __init__(self, path):
+        self._path = path
+        self._pid = None
+
+    def _open(self):
+        # Segments are per process, also when the log was created before forking
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._segment_path = os.path.join(self._path, "{}-{}".format(os.uname()[1], self._pid))
+        os.makedirs(self._segment_path, exist_ok=True)
+        strings_path = os.path.join(self._segment_path, "strings")
+        self._strings = {}
+        if os.path.exists(strings_path):
+            with open(strings_path) as f:
+                self._strings = {value: index for index, value in enumerate(f.read().splitlines())}
+        self._strings_file = open(strings_path, "a")
+        self._decisions = ColumnTable(self._segment_path, DecisionLog.DECISION_COLUMNS)
+        self._hands = ColumnTable(self._segment_path, DecisionLog.HAND_COLUMNS)
+
+    def _string(self, value):
+        try:
+            return self._strings[value]
+        except KeyError:
+            self._strings[value] = len(self._strings)
+            self._strings_file.write(value + "\n")
+            return self._strings[value]
+
+    @staticmethod
+    def hand_hash(hand_id):
+        """64 bits hash of a hand id, as stored in the hand_hash columns."""
+        return struct.unpack("<Q", hashlib.md5(hand_id.encode("utf-8")).digest()[0:8])[0]
+
+    @staticmethod
+    def _card_values(cards, size):
+        values = [int(card) for card in cards][0:size]
+        return values + [0] * (size - len(values))
+
+    def log_decision(self, bot_id, hand_id, street, hole, board, pot, min_bet, max_bet, equity, bet, latency):
+        self._open()
+        self._decisions.append(**{
+            "decisions.bot": self._string(bot_id),
+            "decisions.hand_hash": DecisionLog.hand_hash(hand_id),
+            "decisions.street": street,
+            "decisions.hole": DecisionLog._card_values(hole, 4),
+            "decisions.board": DecisionLog._card_values(board, 5),
+            "decisions.pot": pot,
+            "decisions.min_bet": min_bet,
+            "decisions.max_bet": max_bet,
+            "decisions.equity": math.nan if equity is None else equity,
+            "decisions.choice": DecisionLog.FOLD if bet == -1 else (DecisionLog.CALL if bet == min_bet else DecisionLog.RAISE),
+            "decisions.bet": bet,
+            "decisions.latency": latency,
+        })
+        if self._decisions.rows >= DecisionLog.FLUSH_ROWS:
+            self.flush()
+
+    def log_hand(self, bot_id, hand_id, profit):
+        self._open()
+        self._hands.append(**{
+            "hands.bot": self._string(bot_id),
+            "hands.hand_hash": DecisionLog.hand_hash(hand_id),
+            "hands.profit": profit,
+        })
+        if self._hands.rows >= DecisionLog.FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self._pid != os.getpid():
+            return
+        # Strings first, so that rows never refer to missing strings
+        self._strings_file.flush()
+        self._decisions.flush()
+        self._hands.flush()
+
+    def close(self):
+        self.flush()
+        if self._pid == os.getpid():
+            self._strings_file.close()
+            self._pid = None
+
+
+class DecisionLogReader:
+    """Reads the segments of a decision log as arrays, one per column."""
+    STREETS = ["preflop", "flop", "turn", "river"]
+
+    def __init__(self, path):
+        self._path = path
+
+    def segments(self):
+        for segment in sorted(os.listdir(self._path)):
+            segment_path = os.path.join(self._path, segment)
+            with open(os.path.join(segment_path, "strings")) as f:
+                strings = f.read().splitlines()
+            decisions = ColumnTable.read(segment_path, DecisionLog.DECISION_COLUMNS)
+            hands = ColumnTable.read(segment_path, DecisionLog.HAND_COLUMNS)
+            yield strings, decisions, hands
+
+    def win_rate_by_street_and_equity(self, buckets=10):
+        """
+        Number of decisions, rate of decisions in hands ending with a profit and average hand profit,
+        keyed by street and equity bucket (decisions without equity are in bucket None).
+        The columns of every segment are joined, bucketed and counted with map() and Counter over the arrays,
+        by cell (street and bucket index): only the hand profits are summed in a Python loop.
+        """
+        # Cells of a street: the equity buckets, then the one of decisions without equity
+        street_cells = buckets + 1
+        decisions_count = collections.Counter()
+        wins = collections.Counter()
+        profits = [0.0] * (len(DecisionLogReader.STREETS) * street_cells)
+
+        # Upper bounds of the buckets: NaN compares false with all of them, so bisect puts it past the last one
+        bucket_bounds = [float(bucket) / buckets for bucket in range(1, buckets)] + [math.inf]
+
+        def join_keys(bots, hand_hashes):
+            # (bot, hand) as one int: dictionary encoded bot above the 64 bits hand hash
+            return map(operator.or_, map(operator.lshift, bots, itertools.repeat(64)), hand_hashes)
+
+        for strings, (num_decisions, decisions), (num_hands, hands) in self.segments():
+            results = dict(zip(join_keys(hands["hands.bot"], hands["hands.hand_hash"]), hands["hands.profit"]))
+            # Profit of the hand of every decision, NaN for the hands not over
+            hand_profits = list(map(
+                results.get,
+                join_keys(decisions["decisions.bot"], decisions["decisions.hand_hash"]),
+                itertools.repeat(math.nan)
+            ))
+            cells = list(map(
+                operator.add,
+                map(operator.mul, decisions["decisions.street"], itertools.repeat(street_cells)),
+                map(bisect.bisect_right, itertools.repeat(bucket_bounds), decisions["decisions.equity"])
+            ))
+            over = list(map(operator.eq, hand_profits, hand_profits))
+
+            decisions_count.update(itertools.compress(cells, over))
+            wins.update(itertools.compress(cells, map(operator.gt, hand_profits, itertools.repeat(0.0))))
+            for i, profit in itertools.compress(zip(cells, hand_profits), over):
+                profits[i] += profit
+
+        def key(i):
+            street, bucket = divmod(i, street_cells)
+            return DecisionLogReader.STREETS[street], None if bucket == buckets else bucket
+
+        return {
+            key(i): (count, float(wins[i]) / count, profits[i] / count)
+            for i, count in decisions_count.items()
+        }
@@ -0,0 +1,147 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+
+from virtual_player.canonical import canonical_hand
+
+
+class EquityCache:
+    """
+    Fixed-size equity cache shared by all the processes mapping the same file.
+
+    Entries are keyed by kind of value (hand strength or effective strength, see HandEvaluator), canonical hole
+    cards, board and number of opponents, packed in a 64 bits integer.
+    The table is 4-way set associative: a key can only live in the 4 slots of its bucket and, when they are
+    all taken, the least recently used one (according to a coarse clock) is evicted.
+
+    No lock is taken to read or write: every slot carries a checksum, and a slot being written by another
+    process at the same time fails the check and is treated as missing.
+    Hit and miss counters in the header are shared as well, but updated without locking, so approximate.
+    """
+    MAGIC = b"EQCACHE1"
+    HEADER = struct.Struct("<8sIIQQ")
+    SLOT = struct.Struct("<QQQ")
+    WAYS = 4
+    # Seconds per tick of the clock used for eviction
+    CLOCK_RESOLUTION = 16
+    CHECKSUM = 0x5bd1e9955bd1e995
+    # Shared counters are updated every STATS_INTERVAL lookups
+    STATS_INTERVAL = 256
+    # Kinds of values cached
+    HAND_STRENGTH = 0
+    EFFECTIVE_STRENGTH = 1
+
+    def __init__(self, path, size=1 << 20):
+        self._buckets = max(1, size // EquityCache.WAYS)
+        file_size = EquityCache.HEADER.size + self._buckets * EquityCache.WAYS * EquityCache.SLOT.size
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # The file is initialized (or re-initialized if its size changed or it is not a cache) by one process only
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                magic = os.pread(fd, len(EquityCache.MAGIC), 0)
+                if os.fstat(fd).st_size != file_size or magic != EquityCache.MAGIC:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, file_size)
+                    os.pwrite(fd, EquityCache.HEADER.pack(EquityCache.MAGIC, self._buckets, EquityCache.WAYS, 0, 0), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._data = mmap.mmap(fd, file_size)
+        finally:
+            os.close(fd)
+
+        self.hits = 0
+        self.misses = 0
+        self._pending_hits = 0
+        self._pending_misses = 0
+
+    @staticmethod
+    def key(hole, board, opponents=1, kind=HAND_STRENGTH):
+        """64 bits key of kind, canonical hole cards (up to 4), board and number of opponents (up to 15)."""
+        hole, board = canonical_hand([int(card) for card in hole], [int(card) for card in board])
+        key = (kind << 4) | opponents
+        for value in hole + (0,) * (4 - len(hole)) + board + (0,) * (5 - len(board)):
+            key = (key << 6) | value
+        return key
+
+    def _bucket_offset(self, key):
+        index = ((key * 0x9e3779b97f4a7c15) & 0xffffffffffffffff) >> 32
+        return EquityCache.HEADER.size + (index % self._buckets) * EquityCache.WAYS * EquityCache.SLOT.size
+
+    @staticmethod
+    def _clock():
+        return int(time.time()) // EquityCache.CLOCK_RESOLUTION & 0xffffffff
+
+    def _write(self, offset, key, equity, clock):
+        payload = struct.unpack("<I", struct.pack("<f", equity))[0] | (clock << 32)
+        EquityCache.SLOT.pack_into(self._data, offset, key, payload, key ^ payload ^ EquityCache.CHECKSUM)
+
+    def get(self, hole, board, opponents=1, kind=HAND_STRENGTH):
+        """Cached equity or None."""
+        key = EquityCache.key(hole, board, opponents, kind)
+        offset = self._bucket_offset(key)
+        for _ in range(EquityCache.WAYS):
+            slot_key, payload, checksum = EquityCache.SLOT.unpack_from(self._data, offset)
+            if slot_key == key and checksum == key ^ payload ^ EquityCache.CHECKSUM:
+                equity = struct.unpack("<f", struct.pack("<I", payload & 0xffffffff))[0]
+                clock = EquityCache._clock()
+                if payload >> 32 != clock:
+                    # Recently used
+                    self._write(offset, key, equity, clock)
+                self._count(hit=True)
+                return equity
+            offset += EquityCache.SLOT.size
+        self._count(hit=False)
+        return None
+
+    def put(self, hole, board, equity, opponents=1, kind=HAND_STRENGTH):
+        key = EquityCache.key(hole, board, opponents, kind)
+        offset = self._bucket_offset(key)
+        victim_offset = None
+        victim_clock = None
+        for _ in range(EquityCache.WAYS):
+            slot_key, payload, checksum = EquityCache.SLOT.unpack_from(self._data, offset)
+            if slot_key == key or checksum != slot_key ^ payload ^ EquityCache.CHECKSUM or not slot_key:
+                # Same key, torn or empty slot
+                victim_offset = offset
+                break
+            if victim_clock is None or payload >> 32 < victim_clock:
+                victim_offset, victim_clock = offset, payload >> 32
+            offset += EquityCache.SLOT.size
+        self._write(victim_offset, key, equity, EquityCache._clock())
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+            self._pending_hits += 1
+        else:
+            self.misses += 1
+            self._pending_misses += 1
+        if self._pending_hits + self._pending_misses >= EquityCache.STATS_INTERVAL:
+            self.flush_stats()
+
+    def flush_stats(self):
+        magic, buckets, ways, hits, misses = EquityCache.HEADER.unpack_from(self._data, 0)
+        EquityCache.HEADER.pack_into(
+            self._data, 0, magic, buckets, ways, hits + self._pending_hits, misses + self._pending_misses
+        )
+        self._pending_hits = 0
+        self._pending_misses = 0
+
+    def stats(self):
+        """Host wide (approximate) hits, misses and hit rate."""
+        magic, buckets, ways, hits, misses = EquityCache.HEADER.unpack_from(self._data, 0)
+        hits += self._pending_hits
+        misses += self._pending_misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": float(hits) / (hits + misses) if hits + misses else 0.0
+        }
+
+    def close(self):
+        self.flush_stats()
+        self._data.close()
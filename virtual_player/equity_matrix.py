@@ -0,0 +1,167 @@
+import array
+import math
+import operator
+import os
+import random
+from itertools import combinations
+
+from virtual_player.canonical import HAND_CLASSES, HAND_CLASS_INDEX, HOLDINGS, canonical_board, cards_label, \
+    hand_class
+from virtual_player.hand_ranks import get_hand_ranks
+
+
+class HandClassMatrix:
+    """Equity of every hand class against every other hand class, stored row-major."""
+    SIZE = len(HAND_CLASSES)
+
+    def __init__(self, values):
+        assert len(values) == HandClassMatrix.SIZE * HandClassMatrix.SIZE
+        self._values = values
+
+    @property
+    def values(self):
+        return self._values
+
+    def equity(self, hand_class_a, hand_class_b):
+        """
+        Equity of a hand class against another one, e.g. equity("AKs", "QQ").
+        NaN if the two classes cannot meet (the board blocks them).
+        """
+        return self._values[HAND_CLASS_INDEX[hand_class_a] * HandClassMatrix.SIZE + HAND_CLASS_INDEX[hand_class_b]]
+
+    def save(self, path):
+        # Write and rename, so that concurrent readers never see a partial matrix
+        with open(path + ".tmp", "wb") as f:
+            self._values.tofile(f)
+        os.rename(path + ".tmp", path)
+
+    @staticmethod
+    def load(path):
+        values = array.array("f")
+        with open(path, "rb") as f:
+            values.fromfile(f, HandClassMatrix.SIZE * HandClassMatrix.SIZE)
+        return HandClassMatrix(values)
+
+
+class EquityMatrixCalculator:
+    """
+    Computes hand class equity matrices, preflop or on a given flop, in bulk:
+    every completed board is ranked once for all the holdings, then the holdings are swept in rank order
+    accumulating wins and ties of each class against every other class at once.
+    Matrices are cached on disk keyed by canonical board, as they do not change under suit permutations.
+    """
+    SIZE = HandClassMatrix.SIZE
+
+    def __init__(self, hand_ranks=None, cache_dir=None):
+        self._hand_ranks = hand_ranks if hand_ranks is not None else get_hand_ranks()
+        self._cache_dir = cache_dir
+        self._classes = [hand_class(holding) for holding in HOLDINGS]
+
+    def preflop(self, num_boards=2000, seed=0):
+        """Preflop matrix estimated on num_boards random boards."""
+        def boards():
+            rand = random.Random(seed)
+            deck = list(range(8, 60))
+            for _ in range(num_boards):
+                yield rand.sample(deck, 5)
+        return self._cached("preflop-{}-{}".format(num_boards, seed), boards)
+
+    def flop(self, flop, num_runouts=None, seed=0):
+        """
+        Matrix on a flop (list of cards), over every turn and river runout or over num_runouts random ones.
+        """
+        flop = list(canonical_board([int(card) for card in flop]))
+
+        def boards():
+            deck = [value for value in range(8, 60) if value not in flop]
+            if num_runouts is None:
+                for runout in combinations(deck, 2):
+                    yield flop + list(runout)
+            else:
+                rand = random.Random(seed)
+                for _ in range(num_runouts):
+                    yield flop + rand.sample(deck, 2)
+
+        key = "flop-{}-{}".format(cards_label(flop), "all" if num_runouts is None else "{}-{}".format(num_runouts, seed))
+        return self._cached(key, boards)
+
+    def _cached(self, key, boards):
+        path = os.path.join(self._cache_dir, "{}.bin".format(key)) if self._cache_dir else None
+        if path and os.path.exists(path):
+            return HandClassMatrix.load(path)
+        matrix = self.compute(boards())
+        if path:
+            matrix.save(path)
+        return matrix
+
+    def compute(self, boards):
+        """Matrix over a sequence of complete boards (lists of 5 card values)."""
+        wins = [[0] * self.SIZE for _ in range(self.SIZE)]
+        ties = [[0] * self.SIZE for _ in range(self.SIZE)]
+        counts = [[0] * self.SIZE for _ in range(self.SIZE)]
+
+        for board in boards:
+            self._accumulate(board, wins, ties, counts)
+
+        values = array.array("f", [0.0] * (self.SIZE * self.SIZE))
+        for a in range(self.SIZE):
+            for b in range(self.SIZE):
+                values[a * self.SIZE + b] = (wins[a][b] + ties[a][b] / 2.0) / counts[a][b] if counts[a][b] \
+                    else math.nan
+        return HandClassMatrix(values)
+
+    def _accumulate(self, board, wins, ties, counts):
+        dead = set(board)
+        indexes = [i for i, (x, y) in enumerate(HOLDINGS) if x not in dead and y not in dead]
+
+        # Every holding is ranked once on the board
+        board_key = self._hand_ranks.board(board)
+        ranks = [0] * len(HOLDINGS)
+        for i in indexes:
+            ranks[i] = self._hand_ranks.rank_on_board(board_key, HOLDINGS[i])
+
+        totals = [0] * self.SIZE
+        by_card = {}
+        for i in indexes:
+            totals[self._classes[i]] += 1
+            for value in HOLDINGS[i]:
+                by_card.setdefault(value, []).append(i)
+
+        # Sweep the holdings in rank order: every holding wins against all the holdings already swept
+        # and ties against the ones in its own group of equal rank
+        indexes.sort(key=ranks.__getitem__)
+        below = [0] * self.SIZE
+        start = 0
+        while start < len(indexes):
+            end = start + 1
+            while end < len(indexes) and ranks[indexes[end]] == ranks[indexes[start]]:
+                end += 1
+            group = indexes[start:end]
+            equal = [0] * self.SIZE
+            for i in group:
+                equal[self._classes[i]] += 1
+            for i in group:
+                a = self._classes[i]
+                wins[a] = list(map(operator.add, wins[a], below))
+                ties[a] = list(map(operator.add, ties[a], equal))
+            below = list(map(operator.add, below, equal))
+            start = end
+
+        # Every holding meets all the available holdings
+        for a in range(self.SIZE):
+            if totals[a]:
+                counts[a] = list(map(operator.add, counts[a], [total * totals[a] for total in totals]))
+
+        # Take out the holdings sharing a card with each holding (the holding itself included)
+        for i in indexes:
+            a = self._classes[i]
+            rank = ranks[i]
+            wins_a, ties_a, counts_a = wins[a], ties[a], counts[a]
+            x, y = HOLDINGS[i]
+            for j in by_card[x] + [j for j in by_card[y] if j != i]:
+                b = self._classes[j]
+                counts_a[b] -= 1
+                if ranks[j] < rank:
+                    wins_a[b] -= 1
+                elif ranks[j] == rank:
+                    ties_a[b] -= 1
@@ -0,0 +1,244 @@
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from virtual_player.card import Card
+from virtual_player.score_detector import HandPotential, HoldemPokerScore
+
+
+class EvaluatorError(Exception):
+    pass
+
+
+def _cards(dtos):
+    return [Card(rank, suit) for rank, suit in dtos]
+
+
+def _dtos(cards):
+    return [card.dto() for card in cards]
+
+
+class EvaluatorServer:
+    """
+    Local evaluator daemon: one process owns the lookup tables and the board caches, bots query it over a
+    Unix domain socket (see RemoteHandEvaluator).
+
+    Requests are newline delimited JSON objects:
+        {"id": 1, "method": "hand_strength", "params": {...}, "deadline": <epoch>}
+    Concurrent requests of all the connections are coalesced into batches (see process_batch()), so that
+    requests on the same boards are evaluated together. Requests whose deadline expired before being
+    processed are answered with an error.
+    """
+    BATCH_WINDOW = 0.002
+    MAX_BATCH_SIZE = 256
+
+    def __init__(self, path, hand_evaluator, logger):
+        self._path = path
+        self._hand_evaluator = hand_evaluator
+        self._logger = logger
+        self._requests = queue.Queue()
+
+    def serve_forever(self):
+        requests = self._requests
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                write_lock = threading.Lock()
+
+                def reply(response):
+                    with write_lock:
+                        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                        self.wfile.flush()
+
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        reply({"id": None, "error": "Unable to decode the JSON request"})
+                    else:
+                        requests.put((request, reply))
+
+        batch_thread = threading.Thread(target=self._process_batches)
+        batch_thread.daemon = True
+        batch_thread.start()
+
+        server = socketserver.ThreadingUnixStreamServer(self._path, Handler)
+        server.daemon_threads = True
+        self._logger.info("Evaluator listening on {}".format(self._path))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+    def _next_batch(self):
+        batch = [self._requests.get()]
+        window_end = time.time() + self.BATCH_WINDOW
+        while len(batch) < self.MAX_BATCH_SIZE:
+            timeout = window_end - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _process_batches(self):
+        while True:
+            batch = self._next_batch()
+            responses = self.process_batch([request for request, reply in batch])
+            for (request, reply), response in zip(batch, responses):
+                reply(response)
+
+    def process_batch(self, requests):
+        """
+        Responses to a batch of requests.
+        The hand strengths requested are computed together, those on the same board in one pass
+        (see HandEvaluator.hand_strength_many), the other requests one at a time, earliest deadline first.
+        """
+        responses = [None] * len(requests)
+
+        strength_indexes = [
+            i for i, request in enumerate(requests)
+            if request.get("method") == "hand_strength"
+            and (request.get("deadline") is None or time.time() < request["deadline"])
+        ]
+        if strength_indexes:
+            try:
+                hand_strengths = self._hand_evaluator.hand_strength_many(
+                    [
+                        (_cards(requests[i]["params"]["my_cards"]), _cards(requests[i]["params"]["board"]))
+                        for i in strength_indexes
+                    ],
+                    deadlines=[requests[i].get("deadline") for i in strength_indexes]
+                )
+            except Exception:
+                # Invalid requests in the batch: processing them separately
+                self._logger.exception("Unable to process the batch")
+            else:
+                for i, hand_strength in zip(strength_indexes, hand_strengths):
+                    responses[i] = {"id": requests[i].get("id"), "result": hand_strength}
+
+        for i in sorted(range(len(requests)), key=lambda i: requests[i].get("deadline") or float("inf")):
+            if responses[i] is None:
+                responses[i] = self.process(requests[i])
+        return responses
+
+    def process(self, request):
+        deadline = request.get("deadline")
+        if deadline is not None and time.time() > deadline:
+            return {"id": request.get("id"), "error": "Deadline exceeded"}
+        try:
+            method = getattr(self, "_" + request["method"].replace("-", "_"))
+            return {"id": request.get("id"), "result": method(**request["params"])}
+        except Exception as e:
+            self._logger.exception("Unable to process the request")
+            return {"id": request.get("id"), "error": "Unable to process the request: {}".format(e)}
+
+    def _hand_strength(self, my_cards, board):
+        return self._hand_evaluator.hand_strength(_cards(my_cards), _cards(board))
+
+    def _hand_strength_many(self, hands, deadlines=None):
+        return self._hand_evaluator.hand_strength_many(
+            [(_cards(my_cards), _cards(board)) for my_cards, board in hands],
+            deadlines=deadlines
+        )
+
+    def _hand_potential(self, my_cards, board):
+        return self._hand_evaluator.hand_potential(_cards(my_cards), _cards(board)).__dict__
+
+    def _effective_strength(self, my_cards, board):
+        return self._hand_evaluator.effective_strength(_cards(my_cards), _cards(board))
+
+    def _effective_strength_many(self, hands, deadlines=None):
+        return self._hand_evaluator.effective_strength_many(
+            [(_cards(my_cards), _cards(board)) for my_cards, board in hands],
+            deadlines=deadlines
+        )
+
+    def _get_scores(self, hands):
+        score_detector = self._hand_evaluator.score_detector
+        return [score_detector.get_score(_cards(cards)).dto() for cards in hands]
+
+
+class RemoteHandEvaluator:
+    """HandEvaluator compatible client of an EvaluatorServer."""
+    def __init__(self, path, timeout=5.0):
+        self._path = path
+        self._timeout = timeout
+        self._socket = None
+        self._reader = None
+        self._request_id = 0
+
+    def _connect(self):
+        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client_socket.connect(self._path)
+        except socket.error:
+            client_socket.close()
+            raise
+        self._socket = client_socket
+        self._reader = client_socket.makefile("rb")
+
+    def close(self):
+        if self._socket:
+            self._reader.close()
+            self._socket.close()
+            self._socket = None
+
+    def _call(self, method, **params):
+        self._request_id += 1
+        deadline = time.time() + self._timeout
+        request = {"id": self._request_id, "method": method, "params": params, "deadline": deadline}
+        try:
+            if self._socket is None:
+                self._connect()
+            self._socket.settimeout(self._timeout)
+            self._socket.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            while True:
+                line = self._reader.readline()
+                if not line:
+                    raise EvaluatorError("Connection closed by the evaluator")
+                response = json.loads(line.decode("utf-8"))
+                # Responses to requests given up on (timed out) are skipped
+                if response.get("id") == self._request_id:
+                    break
+        except (socket.error, ValueError) as e:
+            self.close()
+            raise EvaluatorError("Evaluator unavailable: {}".format(e))
+        if "error" in response:
+            raise EvaluatorError(response["error"])
+        return response["result"]
+
+    def hand_strength(self, my_cards, board):
+        return self._call("hand_strength", my_cards=_dtos(my_cards), board=_dtos(board))
+
+    def hand_strength_many(self, hands, deadlines=None):
+        return self._call(
+            "hand_strength_many",
+            hands=[(_dtos(my_cards), _dtos(board)) for my_cards, board in hands],
+            deadlines=deadlines
+        )
+
+    def hand_potential(self, my_cards, board):
+        return HandPotential(**self._call("hand_potential", my_cards=_dtos(my_cards), board=_dtos(board)))
+
+    def effective_strength(self, my_cards, board):
+        return self._call("effective_strength", my_cards=_dtos(my_cards), board=_dtos(board))
+
+    def effective_strength_many(self, hands, deadlines=None):
+        return self._call(
+            "effective_strength_many",
+            hands=[(_dtos(my_cards), _dtos(board)) for my_cards, board in hands],
+            deadlines=deadlines
+        )
+
+    def get_scores(self, hands):
+        """Scores of a batch of card lists."""
+        return [
+            HoldemPokerScore(score["category"], _cards(score["cards"]))
+            for score in self._call("get_scores", hands=[_dtos(cards) for cards in hands])
+        ]
@@ -0,0 +1,142 @@
+import itertools
+import math
+import mmap
+import os
+import struct
+
+from virtual_player.canonical import HAND_CLASSES, canonical_board, hand_class
+from virtual_player.equity_matrix import EquityMatrixCalculator
+
+
+def canonical_flops():
+    """The 1755 flops distinct under suit isomorphism, as sorted tuples of card values."""
+    return sorted(set(canonical_board(flop) for flop in itertools.combinations(range(8, 60), 3)))
+
+
+def _completing_ranks(ranks):
+    """Ranks completing a straight with the given set of ranks (aces count as ones as well)."""
+    ranks = set(ranks)
+    if 14 in ranks:
+        ranks.add(1)
+    completing = set()
+    for low in range(1, 11):
+        missing = set(range(low, low + 5)) - ranks
+        if len(missing) == 1:
+            completing.update(missing)
+    return completing
+
+
+def _has_straight(ranks):
+    ranks = set(ranks)
+    if 14 in ranks:
+        ranks.add(1)
+    return any(ranks.issuperset(range(low, low + 5)) for low in range(1, 11))
+
+
+def texture(flop):
+    """Texture features of a flop (card values), in the order of FlopIndex.TEXTURE."""
+    ranks = [value >> 2 for value in flop]
+    suits = [value & 3 for value in flop]
+    straights = 0
+    straight_draws = 0
+    for hole_ranks in itertools.combinations_with_replacement(range(2, 15), 2):
+        if _has_straight(ranks + list(hole_ranks)):
+            straights += 1
+        elif len(_completing_ranks(ranks + list(hole_ranks))) >= 2:
+            # Open ended or double gutshot
+            straight_draws += 1
+    return (
+        3 - len(set(ranks)),
+        len(set(suits)),
+        max(suits.count(suit) for suit in suits),
+        max(ranks),
+        len([rank for rank in ranks if rank >= 10]),
+        max(ranks) - min(ranks),
+        straights,
+        straight_draws,
+    )
+
+
+class FlopIndex:
+    """
+    Texture features and equity buckets of every hand class on each of the 1755 suit-canonical flops,
+    precomputed by FlopIndex.build() and memory mapped from a file of fixed-size records:
+        3 bytes canonical flop, 8 bytes texture, 169 bytes bucket per hand class (NO_BUCKET if impossible)
+    """
+    MAGIC = b"FLOPIDX1"
+    HEADER = struct.Struct("<8sHH")
+    TEXTURE = (
+        "paired",           # 0 rainbow ranks, 1 paired, 2 trips
+        "suits",            # Number of distinct suits: 1 monotone, 2 two-tone, 3 rainbow
+        "max_suit",         # Most cards of the same suit
+        "high_rank",
+        "broadway",         # Number of cards ten or higher
+        "span",             # Highest minus lowest rank
+        "straights",        # Hole card rank pairs making a straight
+        "straight_draws",   # Hole card rank pairs making an open ended or double gutshot draw
+    )
+    NO_BUCKET = 255
+    RECORD_SIZE = 3 + len(TEXTURE) + len(HAND_CLASSES)
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_buckets, num_flops = FlopIndex.HEADER.unpack_from(self._data, 0)
+        if magic != FlopIndex.MAGIC:
+            raise ValueError("{} is not a flop index".format(path))
+        self._offsets = {}
+        for n in range(num_flops):
+            offset = FlopIndex.HEADER.size + n * FlopIndex.RECORD_SIZE
+            self._offsets[tuple(self._data[offset:offset + 3])] = offset
+
+    def _offset(self, flop):
+        return self._offsets[canonical_board([int(card) for card in flop])]
+
+    def texture(self, flop):
+        """Texture of a flop (3 cards or card values) as a dictionary of features."""
+        offset = self._offset(flop) + 3
+        return dict(zip(FlopIndex.TEXTURE, self._data[offset:offset + len(FlopIndex.TEXTURE)]))
+
+    def bucket(self, flop, hole):
+        """
+        Equity bucket (0 to num_buckets - 1) on a flop of the hand class of two hole cards,
+        i.e. of the average equity of the class against a random hand.
+        """
+        return self._data[self._offset(flop) + 3 + len(FlopIndex.TEXTURE) + hand_class([int(card) for card in hole])]
+
+    def close(self):
+        self._data.close()
+
+    @staticmethod
+    def build(path, num_buckets=8, num_runouts=20, flops=None, cache_dir=None, logger=None):
+        """
+        Computes the index of the canonical flops (all of them by default): equities come from the hand class
+        matrices of EquityMatrixCalculator over num_runouts random turns and rivers (every runout if None).
+        """
+        calculator = EquityMatrixCalculator(cache_dir=cache_dir)
+        size = len(HAND_CLASSES)
+        # Holdings by hand class: pairs, suited and offsuit
+        combos = [6 if len(label) == 2 else (4 if label[2] == "s" else 12) for label in HAND_CLASSES]
+
+        flops = canonical_flops() if flops is None else sorted(set(canonical_board(flop) for flop in flops))
+        with open(path + ".tmp", "wb") as f:
+            f.write(FlopIndex.HEADER.pack(FlopIndex.MAGIC, num_buckets, len(flops)))
+            for n, flop in enumerate(flops):
+                matrix = calculator.flop(list(flop), num_runouts=num_runouts)
+                values = matrix.values
+                buckets = []
+                for a in range(size):
+                    total = weight = 0.0
+                    for b in range(size):
+                        equity = values[a * size + b]
+                        if not math.isnan(equity):
+                            total += equity * combos[b]
+                            weight += combos[b]
+                    buckets.append(
+                        min(int(total / weight * num_buckets), num_buckets - 1) if weight else FlopIndex.NO_BUCKET
+                    )
+                f.write(bytes(flop) + bytes(texture(flop)) + bytes(buckets))
+                if logger and n % 100 == 0:
+                    logger.info("{}/{} flops".format(n, len(flops)))
+        # Write and rename, so that readers never see a partial index
+        os.rename(path + ".tmp", path)
@@ -1,109 +1,137 @@
+import array
+
+from virtual_player.player import Player
+
+
+class SeatedPlayer(Player):
+    """
+    Player bound to a seat of a GamePlayers table.
+    The money lives in the table stacks array so that table snapshots cover it.
+    """
+    def __init__(self, player, stacks, seat):
+        self._stacks = stacks
+        self._seat = seat
+        Player.__init__(self, id=player.id, name=player.name, money=player.money)
+
+    @property
+    def seat(self):
+        return self._seat
+
+    @property
+    def _money(self):
+        return self._stacks[self._seat]
+
+    @_money.setter
+    def _money(self, money):
+        self._stacks[self._seat] = money
+
+
 class GamePlayers:
+    """
+    Compact seat ring.
+    Seats are indexed according to the original players list, the active and dead players are kept
+    as bitmasks (bit i set for seat i) and the stacks in a float array, so that the whole table state
+    can be saved and restored without copying any player object.
+    """
     def __init__(self, players):
-        # Dictionary of players keyed by their ids
-        self._players = {player.id: player for player in players}
-        # List of player ids sorted according to the original players list
-        self._player_ids = [player.id for player in players]
-        # List of folder ids
-        self._folder_ids = set()
-        # Dead players
-        self._dead_player_ids = set()
+        # Seat array stacks
+        self._stacks = array.array("d", [player.money for player in players])
+        # List of players sorted according to the original players list
+        self._players = [SeatedPlayer(player, self._stacks, seat) for seat, player in enumerate(players)]
+        # Dictionary of seats keyed by player ids
+        self._seats = {player.id: seat for seat, player in enumerate(players)}
+        # Bitmask of all the seats
+        self._all_mask = (1 << len(players)) - 1
+        # Bitmask of the active (not folded) seats
+        self._active_mask = self._all_mask
+        # Bitmask of the dead seats
+        self._dead_mask = 0
+
+    def _seat(self, player_id):
+        try:
+            return self._seats[player_id]
+        except KeyError:
+            raise ValueError("Unknown player id")
+
+    def _players_in(self, mask):
+        return [self._players[seat] for seat in range(len(self._players)) if mask & (1 << seat)]
 
     def fold(self, player_id):
-        if player_id not in self._player_ids:
-            raise ValueError("Unknown player id")
-        self._folder_ids.add(player_id)
+        self._active_mask &= ~(1 << self._seat(player_id))
 
     def remove(self, player_id):
         self.fold(player_id)
-        self._dead_player_ids.add(player_id)
+        self._dead_mask |= 1 << self._seat(player_id)
 
     def reset(self):
-        self._folder_ids = set(self._dead_player_ids)
+        self._active_mask = self._all_mask & ~self._dead_mask
+
+    def snapshot(self):
+        """Saves the table state (active and dead players, stacks)."""
+        return self._active_mask, self._dead_mask, self._stacks[:]
+
+    def restore(self, snapshot):
+        """Restores a table state previously saved with snapshot()."""
+        self._active_mask, self._dead_mask, stacks = snapshot
+        # Stacks are replaced in place, so seated players keep pointing to them
+        self._stacks[:] = stacks
 
     def round(self, start_player_id, reverse=False):
-        start_item = self._player_ids.index(start_player_id)
+        start_seat = self._seat(start_player_id)
         step_multiplier = -1 if reverse else 1
-        for i in range(len(self._player_ids)):
-            next_item = (start_item + (i * step_multiplier)) % len(self._player_ids)
-            player_id = self._player_ids[next_item]
-            if player_id not in self._folder_ids:
-                yield self._players[player_id]
-        raise StopIteration
-
-    # def rounder(self, start_player_id):
-    #     def decorator(action):
-    #         def perform():
-    #             start_item = self._player_ids.index(start_player_id)
-    #             try:
-    #                 while True:
-    #                     player_id = self._player_ids[start_item]
-    #                     if player_id not in self._folder_ids:
-    #                         action(self._players[player_id])
-    #                     start_item = (start_item + 1) % len(self._player_ids)
-    #             except StopIteration:
-    #                 pass
-    #         return perform
-    #     return decorator
+        for i in range(len(self._players)):
+            seat = (start_seat + (i * step_multiplier)) % len(self._players)
+            if self._active_mask & (1 << seat):
+                yield self._players[seat]
 
     def get(self, player_id):
-        try:
-            return self._players[player_id]
-        except KeyError:
-            raise ValueError("Unknown player id")
+        return self._players[self._seat(player_id)]
 
     def get_next(self, player_id):
-        if player_id not in self._player_ids:
-            raise ValueError("Unknown player id")
-        if player_id in self._folder_ids:
+        seat = self._seat(player_id)
+        if not self._active_mask & (1 << seat):
             raise ValueError("Inactive player")
-        start_item = self._player_ids.index(player_id)
-        for i in range(len(self._player_ids) - 1):
-            next_index = (start_item + i + 1) % len(self._player_ids)
-            next_id = self._player_ids[next_index]
-            if next_id not in self._folder_ids:
-                return self._players[next_id]
-        return None
+        # Active seats after the current one, or the lowest active seat when wrapping around
+        following = self._active_mask & ~((2 << seat) - 1)
+        candidates = following if following else self._active_mask
+        next_seat = (candidates & -candidates).bit_length() - 1
+        return None if next_seat == seat else self._players[next_seat]
 
     def get_previous(self, player_id):
-        if player_id not in self._player_ids:
-            raise ValueError("Unknown player id")
-        if player_id in self._folder_ids:
+        seat = self._seat(player_id)
+        if not self._active_mask & (1 << seat):
             raise ValueError("Inactive player")
-        start_index = self._player_ids.index(player_id)
-        for i in range(len(self._player_ids) - 1):
-            previous_index = (start_index - i - 1) % len(self._player_ids)
-            previous_id = self._player_ids[previous_index]
-            if previous_id not in self._folder_ids:
-                return self._players[previous_id]
-        return None
+        # Active seats before the current one, or the highest active seat when wrapping around
+        preceding = self._active_mask & ((1 << seat) - 1)
+        candidates = preceding if preceding else self._active_mask
+        previous_seat = candidates.bit_length() - 1
+        return None if previous_seat == seat else self._players[previous_seat]
 
     def is_active(self, player_id):
-        if player_id not in self._player_ids:
-            raise ValueError("Unknown player id")
-        return player_id not in self._folder_ids
+        return bool(self._active_mask & (1 << self._seat(player_id)))
 
     def count_active(self):
-        return len(self._player_ids) - len(self._folder_ids)
+        return bin(self._active_mask).count("1")
 
     def count_active_with_money(self):
-        return len([player for player in self.active if player.money > 0])
+        return len([seat for seat in range(len(self._players))
+                    if self._active_mask & (1 << seat) and self._stacks[seat] > 0])
 
     @property
     def all(self):
-        return [self._players[player_id] for player_id in self._player_ids if player_id not in self._dead_player_ids]
+        return self._players_in(self._all_mask & ~self._dead_mask)
 
     @property
     def folders(self):
-        return [self._players[player_id] for player_id in self._folder_ids]
+        return self._players_in(self._all_mask & ~self._active_mask)
 
     @property
     def dead(self):
-        return [self._players[player_id] for player_id in self._dead_player_ids]
+        return self._players_in(self._dead_mask)
 
     @property
     def active(self):
-        return [self._players[player_id] for player_id in self._player_ids if player_id not in self._folder_ids]
+        return self._players_in(self._active_mask)
 
 
 class GameScores:
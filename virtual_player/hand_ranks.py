@@ -0,0 +1,284 @@
+import array
+import collections
+import itertools
+import threading
+
+from virtual_player.score_detector import HoldemPokerScore, HoldemPokerScoreDetector, OmahaPokerScoreDetector
+
+
+def _hashes(keys, multiplier):
+    return [(key * multiplier) & 0xffffffffffffffff for key in keys]
+
+
+class HoldemHandRanks:
+    """
+    Lookup tables ranking Hold'em hands of up to 7 cards.
+    Ranks are integers equal to the HoldemPokerScore strength of the same cards, so they can be compared
+    with each other and with scores detected by HoldemPokerScoreDetector.
+
+    Hands without a flush are looked up by their multiset of ranks: every card adds 1 to a 3 bits counter
+    of its rank, so the sum of the card keys identifies the multiset.
+    Flushes are looked up by the 13 bits mask of the ranks of the flush suit.
+
+    Tables are flat arrays rather than dictionaries of int objects: lookups do not touch the reference counts
+    of shared objects, so the pages stay shared by the processes forked after building them.
+    The multisets live in an open addressing hash table (multiplicative hashing, linear probing).
+    """
+    MAX_CARDS = 7
+
+    # Card values are (rank << 2) + suit, see Card
+    RANK_KEYS = [1 << (3 * ((value >> 2) - 2)) if value >> 2 >= 2 else 0 for value in range(60)]
+    RANK_BITS = [1 << ((value >> 2) - 2) if value >> 2 >= 2 else 0 for value in range(60)]
+    # Every card adds 1 to a 4 bits counter of its suit: adding 3 to each counter sets its 4th bit when 5+ cards
+    SUIT_KEYS = [1 << (4 * (value & 3)) for value in range(60)]
+    FLUSH_CHECK = 0x3333
+    FLUSH_BITS = 0x8888
+    # 76k rank multisets in 2^18 slots
+    HASH_BITS = 18
+    HASH_SHIFT = 64 - HASH_BITS
+    HASH_MASK = (1 << HASH_BITS) - 1
+    HASH_MULTIPLIER = 0x9e3779b97f4a7c15
+    # Multiplicative hashing is linear: the hash of a sum of rank keys is the sum of the hashes of the
+    # card rank keys (modulo 2^64), so that hashes are accumulated along with the keys and never multiplied
+    RANK_HASHES = _hashes(RANK_KEYS, HASH_MULTIPLIER)
+
+    def __init__(self):
+        self._flush_ranks = array.array("i", (HoldemHandRanks._flush_rank(mask) for mask in range(1 << 13)))
+        # Key 0 (no cards) marks the empty slots
+        self._keys = array.array("Q", [0]) * (1 << HoldemHandRanks.HASH_BITS)
+        self._ranks = array.array("i", [0]) * (1 << HoldemHandRanks.HASH_BITS)
+        self._num_ranks = 0
+        for num_cards in range(1, HoldemHandRanks.MAX_CARDS + 1):
+            for ranks in itertools.combinations_with_replacement(range(2, 15), num_cards):
+                counts = collections.Counter(ranks)
+                if max(counts.values()) <= 4:
+                    key = sum(1 << (3 * (rank - 2)) for rank in ranks)
+                    index = ((key * HoldemHandRanks.HASH_MULTIPLIER) & 0xffffffffffffffff) >> HoldemHandRanks.HASH_SHIFT
+                    while self._keys[index]:
+                        index = (index + 1) & HoldemHandRanks.HASH_MASK
+                    self._keys[index] = key
+                    self._ranks[index] = HoldemHandRanks._multiset_rank(counts)
+                    self._num_ranks += 1
+
+    @property
+    def size(self):
+        return self._num_ranks + len(self._flush_ranks)
+
+    def _multiset(self, rank_key, rank_hash):
+        keys = self._keys
+        index = (rank_hash & 0xffffffffffffffff) >> HoldemHandRanks.HASH_SHIFT
+        while keys[index] != rank_key:
+            index = (index + 1) & HoldemHandRanks.HASH_MASK
+        return self._ranks[index]
+
+    def rank(self, values):
+        """Ranks a list of card values (int(card))."""
+        rank_key = 0
+        rank_hash = 0
+        suit_key = 0
+        for value in values:
+            rank_key += HoldemHandRanks.RANK_KEYS[value]
+            rank_hash += HoldemHandRanks.RANK_HASHES[value]
+            suit_key += HoldemHandRanks.SUIT_KEYS[value]
+        flush_bits = (suit_key + HoldemHandRanks.FLUSH_CHECK) & HoldemHandRanks.FLUSH_BITS
+        if flush_bits:
+            # No more than one flush suit with 7 cards, and no quads or full house alongside it
+            suit = (flush_bits.bit_length() - 4) >> 2
+            mask = 0
+            for value in values:
+                if value & 3 == suit:
+                    mask |= HoldemHandRanks.RANK_BITS[value]
+            return self._flush_ranks[mask]
+        return self._multiset(rank_key, rank_hash)
+
+    def board(self, values):
+        """
+        Pre-computes the keys of a set of cards (typically a board) shared by many hands,
+        see rank_on_board().
+        """
+        rank_key = 0
+        rank_hash = 0
+        suit_key = 0
+        suit_masks = [0, 0, 0, 0]
+        for value in values:
+            rank_key += HoldemHandRanks.RANK_KEYS[value]
+            rank_hash += HoldemHandRanks.RANK_HASHES[value]
+            suit_key += HoldemHandRanks.SUIT_KEYS[value]
+            suit_masks[value & 3] |= HoldemHandRanks.RANK_BITS[value]
+        return rank_key, rank_hash, suit_key, suit_masks
+
+    def rank_on_board(self, board, values):
+        """Ranks a list of card values together with a board returned by board()."""
+        rank_key, rank_hash, suit_key, suit_masks = board
+        for value in values:
+            rank_key += HoldemHandRanks.RANK_KEYS[value]
+            rank_hash += HoldemHandRanks.RANK_HASHES[value]
+            suit_key += HoldemHandRanks.SUIT_KEYS[value]
+        flush_bits = (suit_key + HoldemHandRanks.FLUSH_CHECK) & HoldemHandRanks.FLUSH_BITS
+        if flush_bits:
+            suit = (flush_bits.bit_length() - 4) >> 2
+            mask = suit_masks[suit]
+            for value in values:
+                if value & 3 == suit:
+                    mask |= HoldemHandRanks.RANK_BITS[value]
+            return self._flush_ranks[mask]
+        return self._multiset(rank_key, rank_hash)
+
+    def _parts(self, values, num_cards):
+        # Rank key, rank hash, suit (-1 if not suited) and rank mask of every num_cards sub-combination
+        parts = []
+        for sub_values in itertools.combinations(values, num_cards):
+            rank_key = 0
+            rank_hash = 0
+            mask = 0
+            for value in sub_values:
+                rank_key += HoldemHandRanks.RANK_KEYS[value]
+                rank_hash += HoldemHandRanks.RANK_HASHES[value]
+                mask |= HoldemHandRanks.RANK_BITS[value]
+            suits = set(value & 3 for value in sub_values)
+            parts.append((rank_key, rank_hash, suits.pop() if len(suits) == 1 else -1, mask))
+        return parts
+
+    def omaha_board(self, values):
+        """Pre-computes the 3 cards sub-combinations of an Omaha board, see omaha_rank_on_board()."""
+        return self._parts(values, 3)
+
+    def omaha_hand(self, values):
+        """Pre-computes the 2 cards sub-combinations of an Omaha hand, see omaha_rank_on_board()."""
+        return self._parts(values, 2)
+
+    def omaha_rank_on_board(self, board, hand):
+        """
+        Ranks an Omaha hand returned by omaha_hand() on a board returned by omaha_board():
+        the best of the 5 cards hands made of two cards of the hand and three cards of the board.
+        """
+        keys, ranks, flush_ranks = self._keys, self._ranks, self._flush_ranks
+        best_rank = 0
+        for hand_key, hand_hash, hand_suit, hand_mask in hand:
+            for board_key, board_hash, board_suit, board_mask in board:
+                if hand_suit >= 0 and hand_suit == board_suit:
+                    rank = flush_ranks[hand_mask | board_mask]
+                else:
+                    # Inlined _multiset()
+                    rank_key = hand_key + board_key
+                    index = ((hand_hash + board_hash) & 0xffffffffffffffff) >> HoldemHandRanks.HASH_SHIFT
+                    while keys[index] != rank_key:
+                        index = (index + 1) & HoldemHandRanks.HASH_MASK
+                    rank = ranks[index]
+                if rank > best_rank:
+                    best_rank = rank
+        return best_rank
+
+    @staticmethod
+    def _strength(category, ranks):
+        strength = category
+        for offset in range(5):
+            strength <<= 4
+            if offset < len(ranks):
+                strength += ranks[offset]
+        return strength
+
+    @staticmethod
+    def _straight(ranks):
+        # Highest straight in a set of ranks, with the Ace going under the 2 as well
+        for high in range(14, 5, -1):
+            if all(rank in ranks for rank in range(high - 4, high + 1)):
+                return list(range(high, high - 5, -1))
+        if all(rank in ranks for rank in (14, 2, 3, 4, 5)):
+            return [5, 4, 3, 2, 14]
+        return None
+
+    @staticmethod
+    def _flush_rank(mask):
+        ranks = [rank for rank in range(14, 1, -1) if mask & (1 << (rank - 2))]
+        if len(ranks) < 5:
+            return 0
+        straight = HoldemHandRanks._straight(ranks)
+        if straight:
+            return HoldemHandRanks._strength(HoldemPokerScore.STRAIGHT_FLUSH, straight)
+        return HoldemHandRanks._strength(HoldemPokerScore.FLUSH, ranks[0:5])
+
+    @staticmethod
+    def _multiset_rank(counts):
+        # Ranks sorted by count first, then by rank, both descending
+        groups = sorted(counts.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        ranks = sorted(counts.keys(), reverse=True)
+
+        def kickers(excluded, num_cards):
+            return [rank for rank in ranks if rank not in excluded][0:num_cards]
+
+        best_rank, best_count = groups[0]
+        if best_count == 4:
+            return HoldemHandRanks._strength(HoldemPokerScore.QUADS, [best_rank] * 4 + kickers([best_rank], 1))
+        if best_count == 3:
+            pairs = [rank for rank, count in groups[1:] if count >= 2]
+            if pairs:
+                return HoldemHandRanks._strength(HoldemPokerScore.FULL_HOUSE, [best_rank] * 3 + [max(pairs)] * 2)
+        straight = HoldemHandRanks._straight(ranks)
+        if straight:
+            return HoldemHandRanks._strength(HoldemPokerScore.STRAIGHT, straight)
+        if best_count == 3:
+            return HoldemHandRanks._strength(HoldemPokerScore.TRIPS, [best_rank] * 3 + kickers([best_rank], 2))
+        pairs = [rank for rank, count in groups if count == 2]
+        if len(pairs) >= 2:
+            return HoldemHandRanks._strength(
+                HoldemPokerScore.TWO_PAIR,
+                [pairs[0]] * 2 + [pairs[1]] * 2 + kickers(pairs[0:2], 1)
+            )
+        if pairs:
+            return HoldemHandRanks._strength(HoldemPokerScore.PAIR, [pairs[0]] * 2 + kickers(pairs, 3))
+        return HoldemHandRanks._strength(HoldemPokerScore.NO_PAIR, ranks[0:5])
+
+
+_hand_ranks = None
+_hand_ranks_lock = threading.Lock()
+
+
+def get_hand_ranks():
+    """Gets the process wide lookup tables, building them on first use."""
+    global _hand_ranks
+    if _hand_ranks is None:
+        # Bots running in threads must not all build their own tables
+        with _hand_ranks_lock:
+            if _hand_ranks is None:
+                _hand_ranks = HoldemHandRanks()
+    return _hand_ranks
+
+
+class FastHoldemPokerScoreDetector(HoldemPokerScoreDetector):
+    """Hold'em score detector ranking hands through the lookup tables."""
+    def __init__(self, hand_ranks=None):
+        self._hand_ranks = hand_ranks if hand_ranks is not None else get_hand_ranks()
+
+    def get_rank(self, cards):
+        return self._hand_ranks.rank([int(card) for card in cards])
+
+    def get_board(self, cards):
+        return self._hand_ranks.board([int(card) for card in cards])
+
+    def get_hand(self, cards):
+        return [int(card) for card in cards]
+
+    def get_rank_on_board(self, board, hand):
+        return self._hand_ranks.rank_on_board(board, hand)
+
+
+class FastOmahaPokerScoreDetector(OmahaPokerScoreDetector):
+    """Omaha score detector ranking hands through the lookup tables."""
+    def __init__(self, hand_ranks=None):
+        self._hand_ranks = hand_ranks if hand_ranks is not None else get_hand_ranks()
+
+    def get_rank(self, cards):
+        board = cards[self.HAND_SIZE:]
+        if len(board) < 3:
+            return self._hand_ranks.rank([int(card) for card in cards])
+        return self.get_rank_on_board(self.get_board(board), self.get_hand(cards[0:self.HAND_SIZE]))
+
+    def get_board(self, cards):
+        return self._hand_ranks.omaha_board([int(card) for card in cards])
+
+    def get_hand(self, cards):
+        return self._hand_ranks.omaha_hand([int(card) for card in cards])
+
+    def get_rank_on_board(self, board, hand):
+        return self._hand_ranks.omaha_rank_on_board(board, hand)
@@ -0,0 +1,287 @@
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+
+from virtual_player.bet_strategy import HoldemPlayerClient, stategy_factory
+from virtual_player.channel import Channel, ChannelError, MessageFormatError, MessageTimeout
+from virtual_player.hand_ranks import get_hand_ranks
+from virtual_player.player import Player
+
+
+class LatencyHistogram:
+    """
+    Latencies counted in logarithmic buckets (about 9% wide, from a microsecond to a few minutes):
+    constant memory and time per sample, percentiles accurate to a bucket.
+    """
+    MIN = 1e-6
+    BUCKETS_PER_DOUBLING = 8
+    NUM_BUCKETS = 256
+
+    def __init__(self):
+        self.counts = [0] * LatencyHistogram.NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket(seconds):
+        if seconds <= LatencyHistogram.MIN:
+            return 0
+        index = int(math.log(seconds / LatencyHistogram.MIN, 2) * LatencyHistogram.BUCKETS_PER_DOUBLING) + 1
+        return min(index, LatencyHistogram.NUM_BUCKETS - 1)
+
+    @staticmethod
+    def upper_bound(bucket):
+        return LatencyHistogram.MIN * 2 ** (bucket / float(LatencyHistogram.BUCKETS_PER_DOUBLING))
+
+    def record(self, seconds):
+        self.counts[LatencyHistogram.bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Upper bound of the bucket of the p-th percentile (p between 0 and 100), None if empty."""
+        if not self.count:
+            return None
+        rank = int(math.ceil(self.count * p / 100.0))
+        cumulative = 0
+        for bucket, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= max(rank, 1):
+                return min(LatencyHistogram.upper_bound(bucket), self.max)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max if self.count else None,
+        }
+
+
+class LoadMetrics:
+    """Latency histograms and event counters shared by all the bots of a load test."""
+    LATENCIES = ("handshake", "bet_response", "ping_interval")
+    COUNTERS = ("messages", "decisions", "games", "sessions", "errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        self._started = time.time()
+        self._histograms = {name: LatencyHistogram() for name in LoadMetrics.LATENCIES}
+        self._counters = {name: 0 for name in LoadMetrics.COUNTERS}
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._histograms[name].record(seconds)
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def report(self, reset=False):
+        """Latency summaries and throughput (per second) since the start or the last reset."""
+        with self._lock:
+            elapsed = time.time() - self._started
+            report = {
+                "elapsed": elapsed,
+                "latencies": {name: histogram.summary() for name, histogram in self._histograms.items()},
+                "counters": dict(self._counters),
+                "throughput": {name: count / elapsed for name, count in self._counters.items()},
+            }
+            if reset:
+                self._start()
+            return report
+
+
+class MeasuringChannel(Channel):
+    """
+    Channel measuring the server latencies seen by a bot: from a bet to the next game update, and the interval
+    between the pings of the server (stretching when the server falls behind).
+    Once the stop event of the bot is set, receiving times out: the bot leaves its session.
+    """
+    # Seconds between checks of the stop event while waiting for a message
+    STOP_CHECK_INTERVAL = 0.1
+
+    def __init__(self, channel, metrics, stop=None):
+        self._channel = channel
+        self._metrics = metrics
+        self._stop = stop
+        self._bet_sent = None
+        self._ping_received = None
+
+    def send_message(self, message):
+        self._channel.send_message(message)
+        if message["message_type"] == "bet":
+            self._bet_sent = time.time()
+            self._metrics.count("decisions")
+
+    def _recv_message(self, timeout_epoch):
+        if self._stop is None:
+            return self._channel.recv_message(timeout_epoch)
+        while True:
+            if self._stop.is_set():
+                raise MessageTimeout("Bot stopped")
+            check_epoch = time.time() + MeasuringChannel.STOP_CHECK_INTERVAL
+            try:
+                return self._channel.recv_message(check_epoch if timeout_epoch is None
+                                                  else min(timeout_epoch, check_epoch))
+            except MessageTimeout:
+                if timeout_epoch is not None and time.time() >= timeout_epoch:
+                    raise
+
+    def recv_message(self, timeout_epoch=None):
+        message = self._recv_message(timeout_epoch)
+        received = time.time()
+        self._metrics.count("messages")
+        if message.get("message_type") == "ping":
+            if self._ping_received is not None:
+                self._metrics.record("ping_interval", received - self._ping_received)
+            self._ping_received = received
+        elif message.get("message_type") == "game-update":
+            if self._bet_sent is not None:
+                self._metrics.record("bet_response", received - self._bet_sent)
+                self._bet_sent = None
+            if message.get("event") == "game-over":
+                self._metrics.count("games")
+        return message
+
+    def close(self):
+        self._channel.close()
+
+
+class MeasuringConnector:
+    """Connector timing the connection handshakes, and measuring the sessions (see MeasuringChannel)."""
+    def __init__(self, connector, metrics, stop=None):
+        self._connector = connector
+        self._metrics = metrics
+        self._stop = stop
+
+    def prewarm(self, player):
+        # A stopping bot will not join the session
+        if self._stop is None or not self._stop.is_set():
+            self._connector.prewarm(player)
+
+    def connect(self, player, session_id):
+        started = time.time()
+        server_channel = self._connector.connect(player, session_id)
+        self._metrics.record("handshake", time.time() - started)
+        self._metrics.count("sessions")
+        return MeasuringChannel(server_channel, self._metrics, self._stop)
+
+
+def load_scenario(path):
+    """
+    Scenario of a load test from a JSON file, a list of phases run in order, e.g.
+        {"phases": [
+            {"name": "ramp-up", "bots": 500, "ramp_up": 60, "duration": 60, "strategy": "random"},
+            {"name": "steady", "bots": 500, "duration": 300, "strategy": "smart"}
+        ]}
+    Every phase brings the number of bots to "bots" (new bots starting evenly over "ramp_up" seconds,
+    the extra ones leaving at once), then lasts "duration" seconds.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+class LoadGenerator:
+    """
+    Runs load test scenarios: bots are threads playing through the connectors made by connector_factory.
+    Smart bots are CPU bound, their latencies include the time waiting for the other bots (GIL):
+    random bots load the server best.
+    """
+    # Seconds to wait for the bots to leave at the end of a scenario
+    STOP_TIMEOUT = 30
+
+    def __init__(self, connector_factory, logger, metrics=None, bot_log_level=logging.ERROR):
+        self._connector_factory = connector_factory
+        self._logger = logger
+        self.metrics = metrics if metrics is not None else LoadMetrics()
+        self._bot_log_level = bot_log_level
+        # Player ids are unique across load generators and runs
+        self._run_id = uuid.uuid4().hex[:8]
+        self._next_bot = 0
+        # Stop event of every running bot
+        self._bots = []
+        self._threads = []
+
+    def run(self, scenario):
+        """Runs the phases of a scenario, returns a report (see LoadMetrics.report()) per phase."""
+        if any(phase.get("strategy", "random") != "random" for phase in scenario["phases"]):
+            # Built upfront, not to stall the first decisions measured
+            get_hand_ranks()
+
+        reports = []
+        try:
+            for phase in scenario["phases"]:
+                self._logger.info("Phase {}: {} bots".format(phase.get("name"), phase["bots"]))
+                self.metrics.report(reset=True)
+                self._scale(phase["bots"], phase.get("ramp_up", 0.0), phase.get("strategy", "random"))
+                time.sleep(phase.get("duration", 0.0))
+                report = self.metrics.report(reset=True)
+                report["phase"] = phase.get("name")
+                report["bots"] = self.running_bots()
+                reports.append(report)
+        finally:
+            self.stop(LoadGenerator.STOP_TIMEOUT)
+        return reports
+
+    def running_bots(self):
+        """Number of bots still playing, including those leaving their session."""
+        return len([thread for thread in self._threads if thread.is_alive()])
+
+    def stop(self, timeout=None):
+        """Bots leave their session, waits for them for up to timeout seconds."""
+        self._scale(0)
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.time()))
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+    def _scale(self, num_bots, ramp_up=0.0, strategy="random"):
+        while len(self._bots) > num_bots:
+            self._bots.pop().set()
+        to_start = num_bots - len(self._bots)
+        for n in range(to_start):
+            stop = threading.Event()
+            thread = threading.Thread(target=self._play, args=(self._next_bot, strategy, stop))
+            self._next_bot += 1
+            thread.daemon = True
+            thread.start()
+            self._bots.append(stop)
+            self._threads.append(thread)
+            if ramp_up:
+                time.sleep(ramp_up / to_start)
+
+    def _play(self, n, strategy, stop):
+        player = Player(id="load-{}-{}".format(self._run_id, n), name="Load {}".format(n), money=1000.0)
+        logger = logging.getLogger("loadgen.{}".format(player.id))
+        logger.setLevel(self._bot_log_level)
+        bot = HoldemPlayerClient(
+            player_connector=MeasuringConnector(self._connector_factory(logger), self.metrics, stop),
+            player=player,
+            bet_strategy=stategy_factory(strategy, logger),
+            logger=logger,
+            rejoin=True
+        )
+        while not stop.is_set():
+            try:
+                bot.play()
+            except (ChannelError, MessageTimeout, MessageFormatError) as ex:
+                self.metrics.count("errors")
+                self._logger.warning("Bot {}: {}".format(player.id, ex))
+                stop.wait(1.0)
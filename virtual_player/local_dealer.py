@@ -0,0 +1,157 @@
+import queue
+import random
+import threading
+import time
+import uuid
+
+from virtual_player.channel import Channel, MessageFormatError, MessageTimeout
+
+
+class LocalChannel(Channel):
+    """One end of an in-process channel, messages are passed through queues."""
+    def __init__(self, queue_in, queue_out):
+        self._queue_in = queue_in
+        self._queue_out = queue_out
+
+    @staticmethod
+    def pair():
+        a, b = queue.Queue(), queue.Queue()
+        return LocalChannel(a, b), LocalChannel(b, a)
+
+    def send_message(self, message):
+        self._queue_out.put(message)
+
+    def recv_message(self, timeout_epoch=None):
+        try:
+            if timeout_epoch is None:
+                return self._queue_in.get()
+            return self._queue_in.get(timeout=max(0.0, timeout_epoch - time.time()))
+        except queue.Empty:
+            raise MessageTimeout("Timed out")
+
+
+class LocalDealer:
+    """
+    In-process stand-in for the poker server, to run bots (e.g. the load generator) without Redis.
+    Every session is a short series of heads-up games against a house player who always calls,
+    dealt by a thread speaking the same messages as the server. delay emulates the server processing time.
+    """
+    BIG_BLIND = 10.0
+    SMALL_BLIND = 5.0
+    MONEY = 1000.0
+    BET_TIMEOUT = 30
+
+    def __init__(self, games_per_session=5, delay=0.0, seed=None):
+        self.games_per_session = games_per_session
+        self.delay = delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def open_session(self, player):
+        """Starts dealing to a player, returns the channel of the player."""
+        player_channel, dealer_channel = LocalChannel.pair()
+        with self._lock:
+            seed = self._random.random()
+        thread = threading.Thread(target=self._deal, args=(dealer_channel, player, random.Random(seed)))
+        thread.daemon = True
+        thread.start()
+        return player_channel
+
+    def _send(self, channel, message):
+        if self.delay:
+            time.sleep(self.delay)
+        channel.send_message(message)
+
+    def _deal(self, channel, player, rand):
+        try:
+            self._send(channel, {"message_type": "connect", "server_id": "local-dealer"})
+            for _ in range(self.games_per_session):
+                self._play_game(channel, player, rand)
+            self._send(channel, {"message_type": "disconnect"})
+        except (MessageTimeout, MessageFormatError):
+            # The player is gone
+            pass
+
+    def _play_game(self, channel, player, rand):
+        house = {"id": "house", "name": "House", "money": LocalDealer.MONEY}
+        players = [{"id": player.id, "name": player.name, "money": LocalDealer.MONEY}, house]
+        deck = [[rank, suit] for rank in range(2, 15) for suit in range(4)]
+        rand.shuffle(deck)
+
+        self._send(channel, {
+            "message_type": "game-update",
+            "event": "new-game",
+            "game_id": str(uuid.uuid4()),
+            "players": players,
+            "big_blind": LocalDealer.BIG_BLIND,
+            "small_blind": LocalDealer.SMALL_BLIND
+        })
+        self._send(channel, {"message_type": "game-update", "event": "cards-assignment", "cards": deck[:2]})
+
+        pot = 0.0
+        money = LocalDealer.MONEY
+        folded = False
+        for new_cards in ([], deck[4:7], deck[7:8], deck[8:9]):
+            if new_cards:
+                self._send(channel, {"message_type": "game-update", "event": "shared-cards", "cards": new_cards})
+            min_bet = LocalDealer.BIG_BLIND if not pot else 0.0
+            self._send(channel, {
+                "message_type": "game-update",
+                "event": "player-action",
+                "action": "bet",
+                "player": {"id": player.id},
+                "min_bet": min_bet,
+                "max_bet": money,
+                "bets": {}
+            })
+            message = channel.recv_message(time.time() + LocalDealer.BET_TIMEOUT)
+            MessageFormatError.validate_message_type(message, "bet")
+            bet = message["bet"]
+            if bet < 0:
+                folded = True
+                self._send(channel, {"message_type": "game-update", "event": "fold", "player": {"id": player.id}})
+                break
+            money -= bet
+            pot += 2 * bet
+            for player_id in (player.id, house["id"]):
+                self._send(channel, {
+                    "message_type": "game-update",
+                    "event": "bet",
+                    "player": {"id": player_id},
+                    "bet": bet,
+                    "bet_type": "call" if bet == min_bet else "raise"
+                })
+            self._send(channel, {"message_type": "game-update", "event": "pots-update", "pots": [{"money": pot}]})
+
+        self._send(channel, {"message_type": "ping"})
+        MessageFormatError.validate_message_type(channel.recv_message(time.time() + LocalDealer.BET_TIMEOUT), "pong")
+
+        if pot:
+            winner_ids = ["house"] if folded else rand.choice([[player.id], ["house"], [player.id, "house"]])
+            self._send(channel, {
+                "message_type": "game-update",
+                "event": "winner-designation",
+                "pot": {"money": pot, "winner_ids": winner_ids, "money_split": pot / len(winner_ids)}
+            })
+        self._send(channel, {"message_type": "game-update", "event": "game-over"})
+
+
+class LocalConnector:
+    """
+    Connector of players to a LocalDealer, interchangeable with PlayerClientConnector for HoldemPlayerClient.
+    connect() returns the session channel itself (PlayerClient lives with the Redis connector).
+    """
+    def __init__(self, dealer, logger):
+        self._dealer = dealer
+        self._logger = logger
+
+    def prewarm(self, player):
+        # Local sessions start at once
+        pass
+
+    def connect(self, player, session_id):
+        server_channel = self._dealer.open_session(player)
+        connection_message = server_channel.recv_message(time.time() + LocalDealer.BET_TIMEOUT)
+        MessageFormatError.validate_message_type(connection_message, "connect")
+        self._logger.info("Connected to server {}".format(connection_message["server_id"]))
+        return server_channel
@@ -0,0 +1,175 @@
+import collections
+import fcntl
+import json
+import os
+
+
+class OpponentStats:
+    """
+    Statistics of an opponent, kept as exponentially decayed counters:
+    every new hand scales the past down by the decay factor, so that the stats follow changes of style.
+    """
+    __slots__ = (
+        "hands", "vpip_hands", "pfr_hands", "aggressive", "passive", "showdowns", "showdown_strength",
+        "_vpip", "_pfr"
+    )
+
+    def __init__(self):
+        self.hands = 0.0
+        self.vpip_hands = 0.0
+        self.pfr_hands = 0.0
+        self.aggressive = 0.0
+        self.passive = 0.0
+        self.showdowns = 0.0
+        self.showdown_strength = 0.0
+        # Whether the current hand has already been counted as voluntarily played / raised preflop
+        self._vpip = False
+        self._pfr = False
+
+    def new_hand(self, decay):
+        self.hands = self.hands * decay + 1.0
+        self.vpip_hands *= decay
+        self.pfr_hands *= decay
+        self.aggressive *= decay
+        self.passive *= decay
+        self.showdowns *= decay
+        self.showdown_strength *= decay
+        self._vpip = False
+        self._pfr = False
+
+    def bet(self, bet_type, preflop):
+        if bet_type == "raise":
+            self.aggressive += 1.0
+        elif bet_type == "call":
+            self.passive += 1.0
+        else:
+            # Blinds and checks are not voluntary
+            return
+        if preflop and not self._vpip:
+            self._vpip = True
+            self.vpip_hands += 1.0
+        if preflop and bet_type == "raise" and not self._pfr:
+            self._pfr = True
+            self.pfr_hands += 1.0
+
+    def showdown(self, strength):
+        self.showdowns += 1.0
+        self.showdown_strength += strength
+
+    @property
+    def vpip(self):
+        """Share of the hands voluntarily played preflop."""
+        return self.vpip_hands / self.hands if self.hands else None
+
+    @property
+    def pfr(self):
+        """Share of the hands raised preflop."""
+        return self.pfr_hands / self.hands if self.hands else None
+
+    @property
+    def aggression_factor(self):
+        """Raises per call."""
+        return self.aggressive / self.passive if self.passive else None
+
+    @property
+    def average_showdown_strength(self):
+        return self.showdown_strength / self.showdowns if self.showdowns else None
+
+    def dto(self):
+        return [
+            self.hands, self.vpip_hands, self.pfr_hands, self.aggressive, self.passive, self.showdowns,
+            self.showdown_strength
+        ]
+
+    @staticmethod
+    def from_dto(dto):
+        stats = OpponentStats()
+        stats.hands, stats.vpip_hands, stats.pfr_hands, stats.aggressive, stats.passive, stats.showdowns, \
+            stats.showdown_strength = dto
+        return stats
+
+
+class OpponentStatsTracker:
+    """
+    Statistics of the opponents met, updated in constant time by the game events.
+    Only the max_opponents most recently seen opponents are kept.
+    """
+    def __init__(self, max_opponents=10000, decay=0.99):
+        self.max_opponents = max_opponents
+        self.decay = decay
+        self._stats = collections.OrderedDict()
+        # Opponents updated since the last save
+        self._updated = set()
+
+    def __len__(self):
+        return len(self._stats)
+
+    def __contains__(self, player_id):
+        return player_id in self._stats
+
+    def get(self, player_id):
+        """Stats of an opponent, None if never seen."""
+        return self._stats.get(player_id)
+
+    def _touch(self, player_id):
+        self._updated.add(player_id)
+        try:
+            stats = self._stats[player_id]
+        except KeyError:
+            stats = self._stats[player_id] = OpponentStats()
+            if len(self._stats) > self.max_opponents:
+                evicted_id, _ = self._stats.popitem(last=False)
+                self._updated.discard(evicted_id)
+        else:
+            self._stats.move_to_end(player_id)
+        return stats
+
+    def new_hand(self, player_ids):
+        for player_id in player_ids:
+            self._touch(player_id).new_hand(self.decay)
+
+    def bet(self, player_id, bet_type, preflop):
+        self._touch(player_id).bet(bet_type, preflop)
+
+    def showdown(self, player_id, strength):
+        """Strength between 0 and 1 of the hand shown."""
+        self._touch(player_id).showdown(strength)
+
+    def save(self, path):
+        """
+        Saves the stats merged into the snapshot already saved, e.g. by the other workers of a host:
+        the opponents updated since the last save replace theirs, the others are kept.
+        Saves are serialized by a lock on <path>.lock.
+        """
+        with open(path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            opponents = collections.OrderedDict()
+            if os.path.exists(path):
+                with open(path) as f:
+                    opponents.update((player_id, dto) for player_id, dto in json.load(f)["opponents"])
+            for player_id, stats in self._stats.items():
+                if player_id in self._updated:
+                    # Most recently seen last
+                    opponents.pop(player_id, None)
+                    opponents[player_id] = stats.dto()
+                elif player_id not in opponents:
+                    opponents[player_id] = stats.dto()
+            # Write and rename, so that concurrent readers never see a partial snapshot
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "decay": self.decay,
+                    "opponents": [[player_id, dto] for player_id, dto in opponents.items()][-self.max_opponents:]
+                }, f)
+            os.rename(tmp_path, path)
+        self._updated.clear()
+
+    @staticmethod
+    def load(path, max_opponents=10000):
+        with open(path) as f:
+            snapshot = json.load(f)
+        tracker = OpponentStatsTracker(max_opponents=max_opponents, decay=snapshot["decay"])
+        # Least recently seen first, as saved
+        for player_id, dto in snapshot["opponents"][-max_opponents:]:
+            tracker._stats[player_id] = OpponentStats.from_dto(dto)
+        return tracker
@@ -1,45 +1,126 @@
 import time
+import uuid
 
-from virtual_player.channel import MessageFormatError
+from virtual_player.channel import ChannelError, MessageFormatError, MessageTimeout
+from virtual_player.channel_recorder import MessageLog, MessageLogReader, RecordingChannel, ReplayChannel
 from virtual_player.channel_redis import ChannelRedis, MessageQueue
+from virtual_player.channel_redis_stream import ChannelRedisStream
+from virtual_player.player import Player
 
 
 class PlayerClientConnector:
     CONNECTION_TIMEOUT = 30
 
-    def __init__(self, redis, connection_channel, logger):
+    def __init__(self, redis, connection_channel, logger, message_log=None, channel_factory=ChannelRedis):
         self._redis = redis
+        # Session channel backend: ChannelRedis (lists) or ChannelRedisStream (streams), see stream_channel_factory()
+        self._channel_factory = channel_factory
         self._connection_queue = MessageQueue(redis, connection_channel)
         self._logger = logger
+        self._message_log = message_log
+        # (player id, connection request, server channel) of the session requested by prewarm()
+        self._pending_session = None
+
+    def _request_session(self, player, session_id):
+        connection_request = {
+            "message_type": "connect",
+            "timeout_epoch": time.time() + PlayerClientConnector.CONNECTION_TIMEOUT,
+            "player": {
+                "id": player.id,
+                "name": player.name,
+                "money": player.money
+            },
+            "session_id": session_id
+        }
 
-    def connect(self, player, session_id):
         # Requesting new connection
-        self._connection_queue.push(
-            {
-                "message_type": "connect",
-                "timeout_epoch": time.time() + PlayerClientConnector.CONNECTION_TIMEOUT,
-                "player": {
-                    "id": player.id,
-                    "name": player.name,
-                    "money": player.money
-                },
-                "session_id": session_id
-            }
-        )
+        self._connection_queue.push(connection_request)
 
-        server_channel = ChannelRedis(
+        if self._message_log:
+            self._message_log.append(MessageLog.SENT, connection_request)
+
+        server_channel = self._channel_factory(
             self._redis,
             "poker5:player-{}:session-{}:O".format(player.id, session_id),
             "poker5:player-{}:session-{}:I".format(player.id, session_id)
         )
 
+        if self._message_log:
+            server_channel = RecordingChannel(server_channel, self._message_log)
+
+        return connection_request, server_channel
+
+    def prewarm(self, player):
+        """
+        Requests the next session of a player in advance (e.g. while the current game ends),
+        so that the next connect() only waits for the server response.
+        """
+        self._pending_session = (player.id,) + self._request_session(player, str(uuid.uuid4()))
+
+    def connect(self, player, session_id):
+        """Connects a player, on the session prewarmed for it if still valid (session_id is ignored then)."""
+        pending_session, self._pending_session = self._pending_session, None
+        if pending_session and pending_session[0] == player.id \
+                and time.time() < pending_session[1]["timeout_epoch"]:
+            connection_request, server_channel = pending_session[1:]
+            self._logger.info("Joining prewarmed session {}".format(connection_request["session_id"]))
+        else:
+            if pending_session:
+                pending_session[2].close()
+            connection_request, server_channel = self._request_session(player, session_id)
+
         # Reading connection response
-        connection_message = server_channel.recv_message(time.time() + PlayerClientConnector.CONNECTION_TIMEOUT)
-        MessageFormatError.validate_message_type(connection_message, "connect")
+        try:
+            connection_message = server_channel.recv_message(connection_request["timeout_epoch"])
+            MessageFormatError.validate_message_type(connection_message, "connect")
+        except (ChannelError, MessageFormatError, MessageTimeout):
+            server_channel.close()
+            raise
         self._logger.info("Connected to server {}".format(connection_message["server_id"]))
         return PlayerClient(player, connection_message, server_channel)
 
 
+def stream_channel_factory(multiplexer):
+    """Channel factory for PlayerClientConnector of Redis stream channels, all read by the same multiplexer."""
+    def factory(redis, channel_in, channel_out):
+        return ChannelRedisStream(redis, channel_in, channel_out, multiplexer=multiplexer)
+    return factory
+
+
+class ReplayConnector:
+    """
+    Connector replaying a recording in place of the server: every connect() replays the next recorded session,
+    MessageTimeout is raised once all of them have been replayed.
+    """
+    def __init__(self, path, logger, real_time=False):
+        self._path = path
+        self._logger = logger
+        self._real_time = real_time
+        # Shared by all the sessions, so that each one resumes where the previous one stopped
+        self._channel = None
+
+    def recorded_player(self):
+        # The recording starts with the connection request, which identifies the recorded player
+        for direction, timestamp, message in MessageLogReader(self._path):
+            if direction == MessageLog.SENT and message["message_type"] == "connect":
+                return Player(id=message["player"]["id"], name=message["player"]["name"], money=message["player"]["money"])
+        raise MessageFormatError(desc="Connection request not found in the recording")
+
+    def prewarm(self, player):
+        # Recorded sessions follow each other
+        pass
+
+    def connect(self, player, session_id):
+        if self._channel is None:
+            self._channel = ReplayChannel(self._path, real_time=self._real_time)
+        # Skipping what is left of the previous session (e.g. if the bot timed out)
+        connection_message = self._channel.recv_message()
+        while connection_message.get("message_type") != "connect":
+            connection_message = self._channel.recv_message()
+        self._logger.info("Replaying session from {}".format(self._path))
+        return PlayerClient(player, connection_message, self._channel)
+
+
 class PlayerClient:
     def __init__(self, player, connection_message, server_channel):
         self._player = player
@@ -0,0 +1,95 @@
+import cProfile
+import os
+import time
+
+
+class DecisionProfiler:
+    """
+    Profiles the next decisions of the bots on demand.
+    Once armed (e.g. from a signal handler), the next num_decisions decisions, or the decisions made in the next
+    duration seconds, are profiled with cProfile. When the window closes, stats are dumped to the output directory,
+    one pstats file per bot and street.
+    When not armed, profile() only costs a check of a flag.
+    """
+    STREETS = ["preflop", "flop", "turn", "river"]
+
+    def __init__(self, output_dir, num_decisions=10, duration=None, logger=None):
+        self._output_dir = output_dir
+        self._num_decisions = num_decisions
+        self._duration = duration
+        self._logger = logger
+        self._armed = False
+        self._decisions_left = 0
+        self._deadline = None
+        # Profiles of the current window keyed by (bot id, street)
+        self._profiles = {}
+
+    @property
+    def armed(self):
+        return self._armed
+
+    def arm(self, num_decisions=None, duration=None):
+        """Profiles the next num_decisions decisions or the decisions in the next duration seconds."""
+        num_decisions = self._num_decisions if num_decisions is None else num_decisions
+        duration = self._duration if duration is None else duration
+        self._decisions_left = num_decisions if num_decisions else None
+        self._deadline = time.time() + duration if duration else None
+        self._armed = True
+
+    def profile(self, bot_id, street, function, *args, **kwargs):
+        if not self._armed:
+            return function(*args, **kwargs)
+
+        if self._deadline is not None and time.time() > self._deadline:
+            self.dump()
+            return function(*args, **kwargs)
+
+        key = (bot_id, DecisionProfiler.STREETS[street])
+        if key not in self._profiles:
+            self._profiles[key] = cProfile.Profile()
+        profile = self._profiles[key]
+
+        profile.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            if self._decisions_left is not None:
+                self._decisions_left -= 1
+                if not self._decisions_left:
+                    self.dump()
+
+    def dump(self):
+        """Closes the current window writing the stats collected so far."""
+        self._armed = False
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        for (bot_id, street), profile in self._profiles.items():
+            path = os.path.join(self._output_dir, "{}.{}.{}.prof".format(bot_id, street, timestamp))
+            profile.dump_stats(path)
+            if self._logger:
+                self._logger.info("Profile stats written to {}".format(path))
+        self._profiles = {}
+
+
+class ProfilingBetStrategy:
+    """Bet strategy decorator profiling the decisions through a DecisionProfiler."""
+    def __init__(self, bet_strategy, profiler, bot_id):
+        self._bet_strategy = bet_strategy
+        self._profiler = profiler
+        self._bot_id = bot_id
+
+    @property
+    def last_hand_strength(self):
+        return self._bet_strategy.last_hand_strength
+
+    def bet(self, me, game_state, bets, min_bet, max_bet):
+        return self._profiler.profile(
+            self._bot_id,
+            game_state.state,
+            self._bet_strategy.bet,
+            me=me,
+            game_state=game_state,
+            bets=bets,
+            min_bet=min_bet,
+            max_bet=max_bet
+        )
@@ -1,14 +1,12 @@
-import ctypes
+import array
+import bisect
 import collections
 import random
 import time
 from itertools import combinations
-from multiprocessing import Process, Queue, Manager, Value, Lock
-from queue import Empty
-from scipy.misc import comb
-
 
 from virtual_player.card import Card
+from virtual_player.equity_cache import EquityCache
 
 
 class Cards:
@@ -74,7 +72,12 @@ class Cards:
 
     def full_house(self):
         trips_list = self._x_sorted_list(3)
-        pair_list = self._x_sorted_list(2)
+        # With two trips, the lowest one can make the pair
+        pair_list = sorted(
+            self._x_sorted_list(2) + [trips[0:2] for trips in trips_list[1:]],
+            key=lambda cards: cards[0].rank,
+            reverse=True
+        )
         try:
             return self._merge_with_cards(trips_list[0] + pair_list[0])[0:5]
         except IndexError:
@@ -239,6 +242,22 @@ class ScoreDetector:
     def get_score(self, cards):
         raise NotImplemented
 
+    def get_rank(self, cards):
+        """Gets an integer rank for the cards: the higher the rank, the stronger the hand."""
+        return self.get_score(cards).strength
+
+    def get_board(self, cards):
+        """Pre-evaluates cards shared by many hands (typically a board), see get_rank_on_board()."""
+        return list(cards)
+
+    def get_hand(self, cards):
+        """Pre-evaluates the cards of a hand ranked on many boards, see get_rank_on_board()."""
+        return list(cards)
+
+    def get_rank_on_board(self, board, hand):
+        """Gets the rank of a hand returned by get_hand() together with a board returned by get_board()."""
+        return self.get_rank(hand + board)
+
 
 class TraditionalPokerScoreDetector(ScoreDetector):
     def __init__(self, lowest_rank):
@@ -290,50 +309,442 @@ class HoldemPokerScoreDetector(ScoreDetector):
         raise RuntimeError("Unable to detect the score")
 
 
+class HandPotential:
+    """
+    Hand potential against a random opponent holding, looking ahead one card.
+    - strength: current hand strength (ties count half)
+    - ppot: probability of getting ahead when behind (or tied) now
+    - npot: probability of falling behind when ahead (or tied) now
+    - distribution: hand strength after each possible next card
+    """
+    def __init__(self, strength, ppot, npot, distribution):
+        self.strength = strength
+        self.ppot = ppot
+        self.npot = npot
+        self.distribution = distribution
+
+    @property
+    def effective_strength(self):
+        return self.strength * (1.0 - self.npot) + (1.0 - self.strength) * self.ppot
+
+
+class OmahaPokerScoreDetector(HoldemPokerScoreDetector):
+    """
+    Omaha scores: the first four cards are the hand and the others the board.
+    A score is made of exactly two cards of the hand and three cards of the board.
+    """
+    HAND_SIZE = 4
+
+    def get_score(self, cards):
+        hand = cards[0:self.HAND_SIZE]
+        board = cards[self.HAND_SIZE:]
+        if len(board) < 3:
+            # Not enough board cards (e.g. the hand alone)
+            return HoldemPokerScoreDetector.get_score(self, cards)
+        return max(
+            (
+                HoldemPokerScoreDetector.get_score(self, list(hand_cards) + list(board_cards))
+                for hand_cards in combinations(hand, 2)
+                for board_cards in combinations(board, 3)
+            ),
+            key=lambda score: score.strength
+        )
+
+
+class BoardRanks:
+    """
+    Sorted ranks of every two cards holding on a complete board, overall and by card,
+    so that a holding can be compared with all the others through a few bisections.
+    """
+    def __init__(self, score_detector, board):
+        self.board = score_detector.get_board(board)
+        deck = [
+            card for card in (Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4))
+            if card not in board
+        ]
+        ranks = []
+        by_card = collections.defaultdict(list)
+        for holding in combinations(deck, 2):
+            rank = score_detector.get_rank_on_board(self.board, score_detector.get_hand(holding))
+            ranks.append(rank)
+            for card in holding:
+                by_card[int(card)].append(rank)
+        self._ranks = array.array("i", sorted(ranks))
+        self._ranks_by_card = {card: array.array("i", sorted(card_ranks)) for card, card_ranks in by_card.items()}
+
+    @staticmethod
+    def _count(ranks, rank):
+        lower = bisect.bisect_left(ranks, rank)
+        return lower, bisect.bisect_right(ranks, rank) - lower, len(ranks)
+
+    def count(self, rank, holding):
+        """
+        Number of holdings ranking lower than, equal to and in total, excluding those sharing a card with
+        the given holding, which must be ranked rank.
+        """
+        lower, equal, total = BoardRanks._count(self._ranks, rank)
+        for card in holding:
+            card_lower, card_equal, card_total = BoardRanks._count(self._ranks_by_card[int(card)], rank)
+            lower -= card_lower
+            equal -= card_equal
+            total -= card_total
+        # The holding itself has been taken out twice
+        return lower, equal + 1, total + 1
+
+
 class HandEvaluator:
     BOARD_SIZE = 5
     MAX_SIMULATIONS = 10
-
-    def __init__(self, score_detector):
+    # About 19 KB per BoardRanks: 64 boards (1.2 MB per evaluator) hold those of the last few decisions,
+    # boards seldom come up again in the next hands
+    BOARD_CACHE_SIZE = 64
+
+    # Whether opponent_holdings() enumerates every holding: evaluating a complete board is then exact
+    EXACT_CASES = True
+
+    # Virtual board sampling methods:
+    # - uniform: every board is drawn independently
+    # - stratified: boards are drawn without replacement from one shuffle of the deck until it runs out,
+    #   so every card comes up about as often as the others (e.g. on the turn, 10 simulations see 10 rivers)
+    SAMPLING_UNIFORM = "uniform"
+    SAMPLING_STRATIFIED = "stratified"
+
+    def __init__(self, score_detector, seed=None, sampling=SAMPLING_STRATIFIED, equity_cache=None):
+        if sampling not in (HandEvaluator.SAMPLING_UNIFORM, HandEvaluator.SAMPLING_STRATIFIED):
+            raise ValueError("Unknown sampling method {}".format(sampling))
         self.score_detector = score_detector
-
-    def hand_strength(self, my_cards, board):
+        self.sampling = sampling
+        # Equity cache shared with the other bots of the host (see EquityCache)
+        self.equity_cache = equity_cache
+        self._random = random.Random(seed)
+        # Board ranks by completed board, least recently used first
+        self._board_ranks = collections.OrderedDict()
+
+    def seed(self, seed):
+        """Re-seeds the pseudo random generator of the evaluator."""
+        self._random.seed(seed)
+
+    def hand_strength(self, my_cards, board, simulations=None):
+        if self.equity_cache is None or simulations is not None:
+            return self._hand_strength(my_cards, board, simulations)
+        hand_strength = self.equity_cache.get(my_cards, board)
+        if hand_strength is None:
+            hand_strength = self._hand_strength(my_cards, board)
+            self.equity_cache.put(my_cards, board, hand_strength)
+        return hand_strength
+
+    def _hand_strength(self, my_cards, board, simulations=None):
         deck = [
             card for card in (Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4))
             if card not in my_cards and card not in board
         ]
 
+        if len(board) == HandEvaluator.BOARD_SIZE and self.EXACT_CASES:
+            # Nothing to simulate on the river
+            return self.evaluate_case(my_cards, board, deck)
+
+        max_simulations = self.MAX_SIMULATIONS if simulations is None else simulations
         simulations = 0
         total_ratio = 0.0
 
         for virtual_board, virtual_deck in self.virtual_boards(board, deck):
             total_ratio += self.evaluate_case(my_cards, virtual_board, virtual_deck)
             simulations += 1
-            if simulations == self.MAX_SIMULATIONS:
+            if simulations == max_simulations:
                 break
 
         return total_ratio / float(simulations)
 
+    def hand_strength_many(self, hands, deadlines=None):
+        """
+        Hand strengths of several hands (list of (my_cards, board)) at once, e.g. the pending decisions of many
+        tables. Hands on the same board are evaluated together: each virtual board is drawn once for the group
+        and evaluated for every hand not holding one of its cards, so its board ranks are computed once.
+        Simulations are interleaved across the groups in deadline order, so that every hand gets up to
+        MAX_SIMULATIONS simulations (at least one) before its own deadline.
+        """
+        deadlines = deadlines if deadlines is not None else [None] * len(hands)
+        hand_strengths = [None] * len(hands)
+        totals = [0.0] * len(hands)
+        simulations = [0] * len(hands)
+        # Hands to simulate by board
+        groups = collections.OrderedDict()
+
+        for i, (my_cards, board) in enumerate(hands):
+            if self.equity_cache is not None:
+                hand_strengths[i] = self.equity_cache.get(my_cards, board)
+                if hand_strengths[i] is not None:
+                    continue
+            if len(board) == HandEvaluator.BOARD_SIZE and self.EXACT_CASES:
+                deck = [
+                    card for card in (Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4))
+                    if card not in my_cards and card not in board
+                ]
+                hand_strengths[i] = self.evaluate_case(my_cards, board, deck)
+            else:
+                groups.setdefault(tuple(sorted(int(card) for card in board)), []).append(i)
+
+        def deadline(i):
+            return deadlines[i] if deadlines[i] is not None else float("inf")
+
+        # Virtual boards and hands still simulated of every group, earliest deadline first
+        pending = []
+        for board_key, indexes in groups.items():
+            board = hands[indexes[0]][1]
+            deck = [
+                card for card in (Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4))
+                if int(card) not in board_key
+            ]
+            pending.append((self.virtual_boards(board, deck), sorted(indexes, key=deadline)))
+        pending.sort(key=lambda group: deadline(group[1][0]))
+
+        while pending:
+            still_pending = []
+            for virtual_boards, indexes in pending:
+                virtual_board, virtual_deck = next(virtual_boards)
+                still_simulated = []
+                for i in indexes:
+                    my_cards = hands[i][0]
+                    if not any(card in virtual_board for card in my_cards):
+                        totals[i] += self.evaluate_case(
+                            my_cards,
+                            virtual_board,
+                            [card for card in virtual_deck if card not in my_cards]
+                        )
+                        simulations[i] += 1
+                    if not simulations[i] or (
+                        simulations[i] < self.MAX_SIMULATIONS and (deadlines[i] is None or time.time() < deadlines[i])
+                    ):
+                        still_simulated.append(i)
+                if still_simulated:
+                    still_pending.append((virtual_boards, still_simulated))
+            pending = still_pending
+
+        for indexes in groups.values():
+            for i in indexes:
+                hand_strengths[i] = totals[i] / float(simulations[i])
+
+        if self.equity_cache is not None:
+            # Only complete estimates are shared
+            simulated = set(i for indexes in groups.values() for i in indexes)
+            for i, (my_cards, board) in enumerate(hands):
+                if i not in simulated or simulations[i] == self.MAX_SIMULATIONS:
+                    self.equity_cache.put(my_cards, board, hand_strengths[i])
+
+        return hand_strengths
+
+    def hand_potential(self, my_cards, board):
+        """
+        Hand potential on the flop or the turn, enumerating every next card and every opponent holding.
+        Each next board is evaluated once and shared by all the holdings.
+        """
+        return self.hand_potential_many([(my_cards, board)])[0]
+
+    def hand_potential_many(self, hands, deadlines=None):
+        """
+        Hand potentials of several hands (list of (my_cards, board)) on the flop or the turn.
+        Hands on the same board share the opponent holdings and their ranks on the current and every next board,
+        which take most of the time: each hand then only compares its own ranks.
+        Boards are evaluated earliest deadline first, the potential of a hand past its deadline is None.
+        """
+        deadlines = deadlines if deadlines is not None else [None] * len(hands)
+        groups = collections.OrderedDict()
+        for i, (my_cards, board) in enumerate(hands):
+            groups.setdefault(tuple(sorted(int(card) for card in board)), []).append(i)
+
+        def expired(i):
+            return deadlines[i] is not None and time.time() >= deadlines[i]
+
+        def deadline(i):
+            return deadlines[i] if deadlines[i] is not None else float("inf")
+
+        potentials = [None] * len(hands)
+        for indexes in sorted(groups.values(), key=lambda indexes: min(deadline(i) for i in indexes)):
+            indexes = [i for i in indexes if not expired(i)]
+            if not indexes:
+                continue
+            board = hands[indexes[0]][1]
+            # Cards held by every hand of the group (all of them for a single hand) are out of the deck
+            held = set.intersection(*(set(int(card) for card in hands[i][0]) for i in indexes))
+            deck = [
+                card for card in (Card(rank, suit) for rank in range(2, 15) for suit in range(0, 4))
+                if card not in board and int(card) not in held
+            ]
+            opponents = self.opponent_holdings(deck, len(hands[indexes[0]][0]))
+            opponent_hands = [self.score_detector.get_hand(opponent_cards) for opponent_cards in opponents]
+
+            current_board = self.score_detector.get_board(board)
+            current_ranks = [
+                self.score_detector.get_rank_on_board(current_board, opponent_hand) for opponent_hand in opponent_hands
+            ]
+            # Next card, next board and ranks of the opponent holdings on it (None for those holding the card)
+            next_boards = []
+            for next_card in deck:
+                next_board = self.score_detector.get_board(board + [next_card])
+                next_boards.append((next_card, next_board, [
+                    None if next_card in opponent_cards
+                    else self.score_detector.get_rank_on_board(next_board, opponent_hand)
+                    for opponent_cards, opponent_hand in zip(opponents, opponent_hands)
+                ]))
+
+            for i in indexes:
+                if expired(i):
+                    continue
+                potentials[i] = self._hand_potential(
+                    hands[i][0], current_board, next_boards, opponents, current_ranks
+                )
+        return potentials
+
+    def _hand_potential(self, my_cards, current_board, next_boards, opponents, current_ranks):
+        ahead, tied, behind = 0, 1, 2
+
+        def compare(my_rank, opponent_rank):
+            return ahead if my_rank > opponent_rank else (tied if my_rank == opponent_rank else behind)
+
+        my_hand = self.score_detector.get_hand(my_cards)
+        # Opponent holdings not sharing a card with the hand
+        valid = [
+            n for n, opponent_cards in enumerate(opponents)
+            if not any(card in opponent_cards for card in my_cards)
+        ]
+
+        # Current standing against every opponent holding
+        my_rank = self.score_detector.get_rank_on_board(current_board, my_hand)
+        standings = [compare(my_rank, current_ranks[n]) for n in valid]
+        current_counts = [standings.count(standing) for standing in (ahead, tied, behind)]
+
+        # Transitions from the current standing to the standing after the next card
+        transitions = [[0, 0, 0] for _ in range(3)]
+        distribution = []
+
+        for next_card, next_board, next_ranks in next_boards:
+            if next_card in my_cards:
+                continue
+            my_next_rank = self.score_detector.get_rank_on_board(next_board, my_hand)
+            next_counts = [0, 0, 0]
+            for n, standing in zip(valid, standings):
+                if next_ranks[n] is None:
+                    continue
+                next_standing = compare(my_next_rank, next_ranks[n])
+                transitions[standing][next_standing] += 1
+                next_counts[next_standing] += 1
+            distribution.append((next_counts[ahead] + next_counts[tied] / 2.0) / float(sum(next_counts)))
+
+        def total(standing):
+            return float(sum(transitions[standing]))
+
+        ppot_cases = total(behind) + total(tied) / 2.0
+        npot_cases = total(ahead) + total(tied) / 2.0
+
+        return HandPotential(
+            strength=(current_counts[ahead] + current_counts[tied] / 2.0) / float(len(valid)),
+            ppot=(
+                transitions[behind][ahead] + transitions[behind][tied] / 2.0 + transitions[tied][ahead] / 2.0
+            ) / ppot_cases if ppot_cases else 0.0,
+            npot=(
+                transitions[ahead][behind] + transitions[ahead][tied] / 2.0 + transitions[tied][behind] / 2.0
+            ) / npot_cases if npot_cases else 0.0,
+            distribution=distribution
+        )
+
+    def effective_strength(self, my_cards, board):
+        """Effective strength of the hand potential (see hand_potential()), cached like the hand strengths."""
+        return self.effective_strength_many([(my_cards, board)])[0]
+
+    def effective_strength_many(self, hands, deadlines=None):
+        """
+        Effective strengths of several hands (list of (my_cards, board)), see hand_potential_many().
+        Past its deadline, the effective strength of a hand is only looked up in the cache (None if missing).
+        """
+        deadlines = deadlines if deadlines is not None else [None] * len(hands)
+        effective_strengths = [None] * len(hands)
+        if self.equity_cache is not None:
+            for i, (my_cards, board) in enumerate(hands):
+                effective_strengths[i] = self.equity_cache.get(my_cards, board, kind=EquityCache.EFFECTIVE_STRENGTH)
+        missing = [i for i, effective_strength in enumerate(effective_strengths) if effective_strength is None]
+        if missing:
+            potentials = self.hand_potential_many([hands[i] for i in missing], [deadlines[i] for i in missing])
+            for i, potential in zip(missing, potentials):
+                if potential is None:
+                    continue
+                effective_strengths[i] = potential.effective_strength
+                if self.equity_cache is not None:
+                    my_cards, board = hands[i]
+                    self.equity_cache.put(my_cards, board, effective_strengths[i], kind=EquityCache.EFFECTIVE_STRENGTH)
+        return effective_strengths
+
+    def opponent_holdings(self, deck, num_cards):
+        """Opponent holdings to compare with: all of them."""
+        return list(combinations(deck, num_cards))
+
     def virtual_boards(self, board, deck):
         missing_cards = HandEvaluator.BOARD_SIZE - len(board)
-        while True:
-            random.shuffle(deck)
-            virtual_board = board + deck[:missing_cards]
-            virtual_deck = deck[missing_cards:]
-            yield virtual_board, virtual_deck
+        deck = list(deck)
+        if not missing_cards:
+            # Complete board, evaluated again with other opponent samples
+            while True:
+                yield board, deck
+        if self.sampling == HandEvaluator.SAMPLING_STRATIFIED:
+            while True:
+                self._random.shuffle(deck)
+                for start in range(0, len(deck) - missing_cards + 1, missing_cards):
+                    virtual_board = board + deck[start:start + missing_cards]
+                    virtual_deck = deck[:start] + deck[start + missing_cards:]
+                    yield virtual_board, virtual_deck
+        else:
+            while True:
+                # Partial Fisher-Yates shuffle: only the cards drawn are moved
+                for i in range(missing_cards):
+                    j = self._random.randrange(i, len(deck))
+                    deck[i], deck[j] = deck[j], deck[i]
+                virtual_board = board + deck[:missing_cards]
+                virtual_deck = deck[missing_cards:]
+                yield virtual_board, virtual_deck
+
+    def board_ranks(self, board):
+        key = tuple(sorted(int(card) for card in board))
+        try:
+            board_ranks = self._board_ranks.pop(key)
+        except KeyError:
+            board_ranks = BoardRanks(self.score_detector, board)
+            if len(self._board_ranks) >= self.BOARD_CACHE_SIZE:
+                self._board_ranks.popitem(last=False)
+        self._board_ranks[key] = board_ranks
+        return board_ranks
 
     def evaluate_case(self, my_cards, board, deck):
-        my_score = self.score_detector.get_score(my_cards + board)
+        if len(my_cards) == 2:
+            # Completed boards come up again and again: opponent ranks are computed once per board
+            board_ranks = self.board_ranks(board)
+            my_rank = self.score_detector.get_rank_on_board(board_ranks.board, self.score_detector.get_hand(my_cards))
+            lower, equal, total = board_ranks.count(my_rank, my_cards)
+            # Ties count as wins
+            return float(lower + equal) / float(total)
+
+        board = self.score_detector.get_board(board)
+        my_rank = self.score_detector.get_rank_on_board(board, self.score_detector.get_hand(my_cards))
 
         wins = 0
         defeats = 0
 
-        for opponent_cards in combinations(deck, len(my_cards)):
-            opponent_score = self.score_detector.get_score(list(opponent_cards) + board)
-            score_diff = my_score.cmp(opponent_score)
-            if score_diff < 0:
+        for opponent_cards in self.opponent_holdings(deck, len(my_cards)):
+            opponent_rank = self.score_detector.get_rank_on_board(board, self.score_detector.get_hand(opponent_cards))
+            if opponent_rank > my_rank:
                 defeats += 1
             else:
                 wins += 1
 
         return float(wins) / float(wins + defeats)
+
+
+class OmahaHandEvaluator(HandEvaluator):
+    """
+    Omaha hand evaluator.
+    With four hole cards there are C(45, 4) opponent holdings per board: a random sample is compared instead,
+    so that even complete boards are evaluated MAX_SIMULATIONS times.
+    """
+    OPPONENT_SAMPLES = 200
+    EXACT_CASES = False
+
+    def opponent_holdings(self, deck, num_cards):
+        return [self._random.sample(deck, num_cards) for _ in range(self.OPPONENT_SAMPLES)]